@@ -5,3 +5,10 @@ class ApiConfig(AppConfig):
     name = "api"
     verbose_name = "API"
     verbose_name_plural = "API"
+
+    def ready(self):
+        from django.core.signals import request_started
+
+        from foodgram.db_health import close_unusable_connections
+
+        request_started.connect(close_unusable_connections)
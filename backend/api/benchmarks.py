@@ -0,0 +1,102 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+
+def seed_catalogue(recipes, tags=12, ingredients=200, authors=50,
+                   ingredients_per_recipe=8, tags_per_recipe=3):
+    """
+    Наполняет БД синтетическим каталогом для бенчмарков.
+    Вызывать внутри транзакции, которая затем откатывается.
+    """
+    random.seed(0)
+    prefix = f'bench{random.randrange(10 ** 6)}'
+    tag_objects = Tag.objects.bulk_create(
+        Tag(name=f'{prefix}-tag{i}', color=f'#{random.randrange(16 ** 6):06X}',
+            slug=f'{prefix}-tag{i}')
+        for i in range(tags)
+    )
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'{prefix}-ingredient{i}', unit_of_measurement='г')
+        for i in range(ingredients)
+    )
+    User.objects.bulk_create(
+        User(username=f'{prefix}-user{i}', email=f'{prefix}{i}@bench.local',
+             first_name='Bench', last_name=str(i))
+        for i in range(authors)
+    )
+    tag_ids = list(
+        Tag.objects.filter(slug__startswith=prefix)
+        .values_list('id', flat=True)
+    )
+    ingredient_ids = list(
+        Ingredient.objects.filter(name__startswith=prefix)
+        .values_list('id', flat=True)
+    )
+    author_ids = list(
+        User.objects.filter(username__startswith=prefix)
+        .values_list('id', flat=True)
+    )
+    Recipe.objects.bulk_create(
+        (
+            Recipe(
+                author_id=random.choice(author_ids),
+                name=f'{prefix}-recipe{i}',
+                image=f'recipes/00/{i:064x}.jpg',
+                text='Описание рецепта ' * 10,
+                cooking_time=random.randint(1, 90),
+            )
+            for i in range(recipes)
+        ),
+        batch_size=1000,
+    )
+    recipe_ids = list(
+        Recipe.objects.filter(name__startswith=prefix)
+        .values_list('id', flat=True)
+    )
+    Recipe.tags.through.objects.bulk_create(
+        (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in random.sample(
+                tag_ids, min(tags_per_recipe, len(tag_ids))
+            )
+        ),
+        batch_size=1000,
+    )
+    RecipeIngredient.objects.bulk_create(
+        (
+            RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                             amount=random.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in random.sample(
+                ingredient_ids, ingredients_per_recipe
+            )
+        ),
+        batch_size=1000,
+    )
+    return tag_objects
+
+
+def fake_request(path='/api/recipes/', user=None):
+    """Запрос для сериализаторов, которым нужен request в контексте."""
+    request = RequestFactory().get(path)
+    request.user = user or AnonymousUser()
+    return request
+
+
+def measure(func, repeat):
+    """Лучшее время выполнения func из repeat попыток, в секундах."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
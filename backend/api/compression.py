@@ -0,0 +1,75 @@
+import gzip
+import io
+import re
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(application/(json|javascript|xml|x-yaml|yaml|vnd\.oai\.openapi)'
+    r'|text/)'
+)
+
+
+def available_encodings():
+    """Поддерживаемые кодировки в порядке предпочтения."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encoding):
+    """
+    Кодировка ответа по заголовку Accept-Encoding: br, если модуль
+    brotli установлен и клиент его принимает, иначе gzip, иначе None.
+    """
+    accepted = set()
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    for encoding in available_encodings():
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return None
+
+
+def is_compressible(response):
+    """Ответ стоит сжимать: текстовый, достаточно большой, не сжатый."""
+    return (
+        not response.streaming
+        and not response.has_header('Content-Encoding')
+        and len(response.content) >= settings.COMPRESS_MIN_SIZE
+        and COMPRESSIBLE_TYPES.match(response.get('Content-Type', ''))
+        is not None
+    )
+
+
+def compress(content, encoding, cached=False):
+    """
+    Сжать тело ответа. Для ответов из кеша, которые сжимаются один раз,
+    используется более высокая степень сжатия.
+    """
+    if encoding == 'br':
+        return brotli.compress(content, quality=(
+            settings.COMPRESS_CACHED_BROTLI_QUALITY if cached
+            else settings.COMPRESS_BROTLI_QUALITY
+        ))
+    buffer = io.BytesIO()
+    level = (
+        settings.COMPRESS_CACHED_GZIP_LEVEL if cached
+        else settings.COMPRESS_GZIP_LEVEL
+    )
+    with gzip.GzipFile(
+        mode='wb', compresslevel=level, fileobj=buffer, mtime=0
+    ) as file:
+        file.write(content)
+    return buffer.getvalue()
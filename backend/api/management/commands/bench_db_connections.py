@@ -0,0 +1,72 @@
+import statistics
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import BaseCommand
+from django.db import connections
+from django.test.utils import override_settings
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк задержки запроса с новым соединением к БД на каждый
+    запрос (CONN_MAX_AGE=0) и с постоянным соединением. Запросы идут
+    через WSGIHandler, поэтому соединения открываются и закрываются
+    так же, как в воркере gunicorn. Кеш ответов на время бенчмарка
+    отключается, иначе запросы не доходят до БД.
+    """
+    help = 'Compare request latency with new and persistent DB connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/tags/')
+        parser.add_argument('--requests', type=int, default=200)
+
+    @override_settings(RESPONSE_CACHE_RULES=())
+    def handle(self, *args, **options):
+        handler = WSGIHandler()
+        databases = [connections[alias] for alias in connections]
+        saved = {
+            connection.alias: connection.settings_dict['CONN_MAX_AGE']
+            for connection in databases
+        }
+        engine = connections['default'].settings_dict['ENGINE']
+        first = (
+            'пул, возврат в пул после запроса'
+            if engine == 'foodgram.db_pool' else 'новое соединение'
+        )
+        try:
+            for label, max_age in ((first, 0), ('постоянное соединение', 600)):
+                for connection in databases:
+                    connection.close()
+                    connection.settings_dict['CONN_MAX_AGE'] = max_age
+                timings = self.run(handler, options['path'],
+                                   options['requests'])
+                self.report(label, timings)
+        finally:
+            for connection in databases:
+                connection.close()
+                connection.settings_dict['CONN_MAX_AGE'] = saved[
+                    connection.alias
+                ]
+
+    def run(self, handler, path, count):
+        timings = []
+        for _ in range(count + 1):
+            environ = {'PATH_INFO': path, 'HTTP_HOST': 'localhost'}
+            setup_testing_defaults(environ)
+            started = time.perf_counter()
+            response = handler(environ, lambda status, headers: None)
+            b''.join(response)
+            response.close()
+            timings.append(time.perf_counter() - started)
+        return timings[1:]
+
+    def report(self, label, timings):
+        timings = sorted(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(
+            f'{label:<34} среднее {statistics.mean(timings) * 1000:7.2f} мс,'
+            f' p50 {statistics.median(timings) * 1000:7.2f} мс,'
+            f' p95 {p95 * 1000:7.2f} мс'
+        )
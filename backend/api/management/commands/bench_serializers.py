@@ -0,0 +1,90 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api.benchmarks import fake_request, measure, seed_catalogue
+from api.recipes.light_serializers import (recipe_rows, recipe_short_rows,
+                                           recipe_values, tag_rows)
+from api.recipes.serializers import (RecipeSerializer, RecipeShortSerializer,
+                                     TagSerializer)
+from api.renderers import FastJSONRenderer
+from recipes.models import Recipe, Tag
+
+
+class Command(BaseCommand):
+    """
+    Микробенчмарк сериализации списков: ModelSerializer + JSONRenderer
+    против облегченной сериализации + FastJSONRenderer.
+    """
+    help = 'Measure per-item cost of recipe/tag list serialization'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Создать N синтетических рецептов (откатывается в конце)'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['seed']:
+                seed_catalogue(options['seed'])
+            self.run(options['limit'], options['repeat'])
+            transaction.set_rollback(True)
+
+    def run(self, limit, repeat):
+        request = fake_request()
+        context = {'request': request}
+        default, fast = JSONRenderer(), FastJSONRenderer()
+        recipes = Recipe.objects.all()
+        ids = list(recipes.values_list('id', flat=True)[:limit])
+        if not ids:
+            self.stderr.write('Нет рецептов, используйте --seed.')
+            return
+        recipes = recipes.filter(id__in=ids)
+
+        cases = {
+            'recipes': (
+                lambda: RecipeSerializer(
+                    recipes.select_related('author')
+                    .prefetch_related('tags', 'recipe_ingredients'
+                                      '__ingredient'),
+                    many=True, context=context
+                ).data,
+                lambda: recipe_rows(recipe_values(recipes), request),
+                len(ids),
+            ),
+            'recipes_short': (
+                lambda: RecipeShortSerializer(
+                    recipes, many=True, context=context
+                ).data,
+                lambda: recipe_short_rows(recipes, request),
+                len(ids),
+            ),
+            'tags': (
+                lambda: TagSerializer(
+                    Tag.objects.all(), many=True
+                ).data,
+                lambda: tag_rows(Tag.objects.all()),
+                Tag.objects.count(),
+            ),
+        }
+        for name, (model_path, light_path, count) in cases.items():
+            if not count:
+                continue
+            same = default.render(model_path()) == fast.render(light_path())
+            timings = (
+                ('ModelSerializer + JSONRenderer',
+                 lambda: default.render(model_path())),
+                ('ModelSerializer + FastJSONRenderer',
+                 lambda: fast.render(model_path())),
+                ('light + FastJSONRenderer',
+                 lambda: fast.render(light_path())),
+            )
+            self.stdout.write(
+                f'{name}: {count} шт., вывод совпадает: {same}'
+            )
+            for label, func in timings:
+                per_item = measure(func, repeat) / count * 1e6
+                self.stdout.write(f'  {label:<36} {per_item:8.1f} мкс/шт.')
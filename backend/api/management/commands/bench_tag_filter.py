@@ -0,0 +1,63 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.http import QueryDict
+
+from api.benchmarks import fake_request, measure, seed_catalogue
+from api.recipes.filters import RecipeFilter
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк фильтра по тегам: JOIN через M2M с DISTINCT против
+    EXISTS-подзапроса RecipeFilter, count и первая страница.
+    """
+    help = 'Compare JOIN+DISTINCT and EXISTS tag filtering'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=20000)
+        parser.add_argument('--tags', type=int, default=12)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--limit', type=int, default=6)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            tags = seed_catalogue(options['seed'], tags=options['tags'])
+            self.run(
+                [tag.slug for tag in tags],
+                options['repeat'],
+                options['limit'],
+            )
+            transaction.set_rollback(True)
+
+    def run(self, slugs, repeat, limit):
+        request = fake_request()
+        recipes = Recipe.objects.all()
+
+        def exists_filter(match):
+            data = QueryDict(mutable=True)
+            data.setlist('tags', slugs)
+            data['tags_match'] = match
+            return RecipeFilter(
+                data=data, queryset=recipes, request=request
+            ).qs
+
+        cases = (
+            ('JOIN + DISTINCT (any)',
+             lambda: recipes.filter(tags__slug__in=slugs).distinct()),
+            ('EXISTS (any)', lambda: exists_filter('any')),
+            ('EXISTS (all)', lambda: exists_filter('all')),
+        )
+        self.stdout.write(f'Выбрано тегов: {len(slugs)}')
+        for label, build in cases:
+            count = build().count()
+
+            def query(build=build):
+                queryset = build()
+                queryset.count()
+                list(queryset.values_list('id', flat=True)[:limit])
+
+            self.stdout.write(
+                f'  {label:<24} найдено {count:>7}, '
+                f'{measure(query, repeat) * 1000:8.1f} мс'
+            )
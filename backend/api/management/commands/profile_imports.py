@@ -0,0 +1,126 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+# Код запуска воркера: то же, что делает gunicorn при загрузке
+# foodgram.wsgi и прогреве из хуков gunicorn.conf.py, плюс загрузка
+# URLconf перед первым запросом.
+BOOT_CODE = '''
+import time
+started = time.perf_counter()
+from foodgram.wsgi import application
+from django.conf import settings
+from django.urls import get_resolver
+if settings.WARM_UP_ON_START:
+    from foodgram.warmup import warm_up
+    warm_up()
+get_resolver().url_patterns
+print(time.perf_counter() - started)
+'''
+
+
+class Command(BaseCommand):
+    """
+    Отчет о времени импорта при запуске воркера. Запуск идет в
+    отдельном процессе с python -X importtime, поэтому в отчет
+    попадают все модули, загруженные при старте, включая Django.
+    """
+    help = 'Report import time of a fresh worker by module and package'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25)
+        parser.add_argument(
+            '--json', action='store_true', help='вывести отчет в JSON'
+        )
+        parser.add_argument(
+            '--no-warm-up', action='store_true',
+            help='запуск без прогрева (WARM_UP_ON_START=False)'
+        )
+
+    def handle(self, *args, **options):
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE=os.environ.get(
+                'DJANGO_SETTINGS_MODULE', 'foodgram.settings'
+            ),
+        )
+        if options['no_warm_up']:
+            env['WARM_UP_ON_START'] = 'False'
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT_CODE],
+            cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True, check=False,
+        )
+        if result.returncode:
+            self.stderr.write(result.stderr[-2000:])
+            raise SystemExit(result.returncode)
+        report = self.build_report(
+            result.stderr, float(result.stdout.split()[-1]), options['top']
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    @staticmethod
+    def parse(output):
+        """Строки importtime: (модуль, собственное время, общее время)."""
+        modules = []
+        for line in output.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line.split('|')
+            modules.append((
+                name.strip(),
+                int(self_us.split(':')[1]),
+                int(cumulative_us),
+            ))
+        return modules
+
+    def build_report(self, output, startup_seconds, top):
+        modules = self.parse(output)
+        packages = defaultdict(int)
+        for name, self_us, _ in modules:
+            packages[name.split('.')[0]] += self_us
+        return {
+            'startup_ms': round(startup_seconds * 1000, 1),
+            'imports_ms': round(sum(item[1] for item in modules) / 1000, 1),
+            'modules_count': len(modules),
+            'packages': [
+                {'package': name, 'ms': round(us / 1000, 1)}
+                for name, us in sorted(
+                    packages.items(), key=lambda item: -item[1]
+                )[:top]
+            ],
+            'modules': [
+                {
+                    'module': name,
+                    'self_ms': round(self_us / 1000, 1),
+                    'cumulative_ms': round(cumulative_us / 1000, 1),
+                }
+                for name, self_us, cumulative_us in sorted(
+                    modules, key=lambda item: -item[1]
+                )[:top]
+            ],
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'Запуск воркера: {report["startup_ms"]} мс, импорт '
+            f'{report["modules_count"]} модулей: {report["imports_ms"]} мс'
+        )
+        self.stdout.write('\nПакеты (собственное время модулей):')
+        for item in report['packages']:
+            self.stdout.write(f'{item["ms"]:>9.1f} мс  {item["package"]}')
+        self.stdout.write('\nМодули (собственное / общее время):')
+        for item in report['modules']:
+            self.stdout.write(
+                f'{item["self_ms"]:>9.1f} / {item["cumulative_ms"]:>7.1f} мс'
+                f'  {item["module"]}'
+            )
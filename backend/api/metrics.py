@@ -0,0 +1,305 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+SIZE_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+HISTOGRAMS = {
+    'foodgram_http_request_duration_seconds': (
+        'Время обработки запроса в секундах.', LATENCY_BUCKETS
+    ),
+    'foodgram_http_response_size_bytes': (
+        'Размер тела ответа в байтах.', SIZE_BUCKETS
+    ),
+    'foodgram_db_queries_per_request': (
+        'Количество SQL-запросов на один HTTP-запрос.', QUERY_BUCKETS
+    ),
+}
+COUNTERS = {
+    'foodgram_http_requests_total': 'Количество обработанных запросов.',
+    'foodgram_cache_requests_total': 'Обращения к кешу (hit/miss).',
+    'foodgram_throttled_requests_total': (
+        'Запросы, отклоненные ограничением частоты.'
+    ),
+}
+
+
+def merge_snapshots(snapshots):
+    """Сумма значений нескольких процессов в формате snapshot()."""
+    counters = defaultdict(float)
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            counters[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, histogram in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, {
+                'buckets': [0] * len(histogram['buckets']),
+                'sum': 0.0,
+            })
+            for index, count in enumerate(histogram['buckets']):
+                total['buckets'][index] += count
+            total['sum'] += histogram['sum']
+    return counters, histograms
+
+
+def _read_snapshot(path):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(path, snapshot):
+    """Атомарная запись через временный файл."""
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(snapshot, file)
+    os.replace(tmp_path, path)
+
+
+class MetricsRegistry:
+    """
+    Счетчики и гистограммы текущего процесса.
+
+    Каждый воркер gunicorn держит свои значения в памяти, а фоновый поток
+    раз в METRICS_FLUSH_INTERVAL сбрасывает их в отдельный файл каталога
+    METRICS_DIR. Эндпоинт метрик суммирует файлы всех воркеров, поэтому
+    запись не требует блокировок между процессами. Значения завершенных
+    воркеров мастер переносит в общий файл (см. mark_process_dead).
+    """
+    archive_name = 'metrics_dead.json'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pid = None
+        self._flusher_pid = None
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        # Имя файла уникально для процесса, даже если pid повторится.
+        self._file_name = f'metrics_{self._pid}_{time.time_ns()}.json'
+        self._counters = defaultdict(float)
+        self._histograms = {}
+
+    def _check_pid(self):
+        """
+        После fork начинаем с нуля, чтобы не дублировать значения, и
+        запускаем поток сброса в новом процессе.
+        """
+        if self._pid != os.getpid():
+            self._reset()
+        if self._flusher_pid != self._pid:
+            self._flusher_pid = self._pid
+            threading.Thread(
+                target=self._flush_loop, name='metrics-flush', daemon=True
+            ).start()
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0))
+            try:
+                self.flush()
+            except OSError:
+                continue
+
+    @property
+    def directory(self):
+        directory = getattr(settings, 'METRICS_DIR', None)
+        return Path(directory) if directory else None
+
+    def inc(self, name, labels, value=1):
+        """Увеличить счетчик."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_pid()
+            self._counters[key] += value
+
+    def observe(self, name, labels, value):
+        """Записать наблюдение в гистограмму."""
+        buckets = HISTOGRAMS[name][1]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_pid()
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    'buckets': [0] * (len(buckets) + 1),
+                    'sum': 0.0,
+                }
+            histogram['buckets'][bisect_left(buckets, value)] += 1
+            histogram['sum'] += value
+
+    def snapshot(self):
+        """Копия значений процесса в сериализуемом виде."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            return {
+                'counters': [
+                    [name, list(labels), value]
+                    for (name, labels), value in self._counters.items()
+                ],
+                'histograms': [
+                    [name, list(labels), dict(
+                        histogram, buckets=list(histogram['buckets'])
+                    )]
+                    for (name, labels), histogram
+                    in self._histograms.items()
+                ],
+            }
+
+    def flush(self):
+        """Атомарно записать значения процесса в файл воркера."""
+        directory = self.directory
+        if directory is None:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._flush_lock:
+            snapshot = self.snapshot()
+            _write_snapshot(directory / self._file_name, snapshot)
+
+    def clear(self):
+        """Удалить файлы прошлого запуска (вызывается в мастере)."""
+        directory = self.directory
+        if directory is None or not directory.exists():
+            return
+        for path in directory.glob('metrics_*'):
+            path.unlink()
+
+    def mark_process_dead(self, pid):
+        """
+        Перенести значения завершенного воркера в общий файл и удалить
+        файл воркера: счетчики не уменьшаются, а новый процесс с тем же
+        pid начинает свой файл с нуля. Вызывается в мастере.
+        """
+        directory = self.directory
+        if directory is None:
+            return
+        paths = list(directory.glob(f'metrics_{pid}_*.json'))
+        snapshots = list(filter(None, map(_read_snapshot, paths)))
+        if not snapshots:
+            return
+        archive_path = directory / self.archive_name
+        archive = _read_snapshot(archive_path)
+        counters, histograms = merge_snapshots(
+            snapshots + ([archive] if archive else [])
+        )
+        _write_snapshot(archive_path, {
+            'merged': [path.name for path in paths],
+            'counters': [
+                [name, list(labels), value]
+                for (name, labels), value in counters.items()
+            ],
+            'histograms': [
+                [name, list(labels), histogram]
+                for (name, labels), histogram in histograms.items()
+            ],
+        })
+        for path in paths:
+            path.unlink()
+
+    def collect(self):
+        """Собрать значения всех воркеров."""
+        directory = self.directory
+        if directory is None or not directory.exists():
+            return merge_snapshots([self.snapshot()])
+        self.flush()
+        workers = {
+            path.name: _read_snapshot(path)
+            for path in directory.glob('metrics_*_*.json')
+        }
+        # Общий файл читается после файлов воркеров: если воркер уже
+        # перенесен в него, его собственный файл не учитывается.
+        archive = _read_snapshot(directory / self.archive_name)
+        snapshots = [archive] if archive else []
+        merged = set(archive['merged']) if archive else set()
+        snapshots.extend(
+            snapshot for name, snapshot in workers.items()
+            if name not in merged
+        )
+        return merge_snapshots(filter(None, snapshots))
+
+
+registry = MetricsRegistry()
+
+
+def observe_cache(cache_name, hit):
+    """Учесть попадание или промах кеша."""
+    registry.inc(
+        'foodgram_cache_requests_total',
+        {'cache': cache_name, 'result': 'hit' if hit else 'miss'}
+    )
+
+
+def _format_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(
+            key,
+            str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for key, value in items
+    )
+    return '{' + body + '}'
+
+
+def _format_number(value):
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render_metrics():
+    """Выгрузка метрик в текстовом формате Prometheus."""
+    counters, histograms = registry.collect()
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(
+                    f'{name}{_format_labels(labels)} {_format_number(value)}'
+                )
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(
+                list(buckets) + ['+Inf'], histogram['buckets']
+            ):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{_format_labels(labels, le=bound)} '
+                    f'{cumulative}'
+                )
+            lines.append(
+                f'{name}_sum{_format_labels(labels)} '
+                f'{_format_number(histogram["sum"])}'
+            )
+            lines.append(
+                f'{name}_count{_format_labels(labels)} {cumulative}'
+            )
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,289 @@
+import hashlib
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from foodgram.db_router import (choose_replica, reset_read_database,
+                                set_read_database)
+from recipes.cache import get_recipes_version
+
+from .compression import choose_encoding, compress, is_compressible
+from .metrics import observe_cache, registry
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class QueryCounter:
+    """execute_wrapper, считающий SQL-запросы."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def get_view_labels(view_func):
+    """Имя представления и действие DRF для меток метрик."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', 'unknown'), ''
+    return view_class.__name__, getattr(view_func, 'actions', None) or {}
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики по каждому представлению и действию DRF:
+    время ответа, количество SQL-запросов, размер ответа и статус.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        view, actions = getattr(
+            request, '_metrics_view', ('unmatched', '')
+        )
+        action = (
+            actions.get(request.method.lower(), '')
+            if isinstance(actions, dict) else actions
+        )
+        labels = {'view': view, 'action': action}
+        registry.inc('foodgram_http_requests_total', dict(
+            labels,
+            method=request.method,
+            status=f'{response.status_code // 100}xx',
+        ))
+        registry.observe(
+            'foodgram_http_request_duration_seconds', labels, duration
+        )
+        registry.observe(
+            'foodgram_db_queries_per_request', labels, counter.count
+        )
+        if not response.streaming:
+            registry.observe(
+                'foodgram_http_response_size_bytes',
+                labels,
+                len(response.content)
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_view = get_view_labels(view_func)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Отправляет чтения GET-запросов к представлениям из REPLICA_VIEWS
+    в реплику. После успешной записи клиент на DB_STICKY_SECONDS
+    закрепляется за основной БД, чтобы видеть свои изменения: метка
+    хранится в кеше по токену и дублируется cookie для браузера.
+    """
+    cookie_name = 'db_primary'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    def get_client_key(credentials):
+        digest = hashlib.sha1(credentials.encode()).hexdigest()
+        return f'db:sticky:{digest}'
+
+    def get_request_key(self, request):
+        credentials = (
+            request.META.get('HTTP_AUTHORIZATION')
+            or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        )
+        return self.get_client_key(credentials) if credentials else None
+
+    def get_issued_keys(self, response):
+        """
+        Ключи учетных данных, выданных ответом (вход по токену или
+        новая сессия): клиент придет с ними, а не с прежними.
+        """
+        keys = []
+        token = getattr(response, 'data', None)
+        if isinstance(token, dict) and token.get('auth_token'):
+            keys.append(self.get_client_key(f'Token {token["auth_token"]}'))
+        session = response.cookies.get(settings.SESSION_COOKIE_NAME)
+        if session is not None and session.value:
+            keys.append(self.get_client_key(session.value))
+        return keys
+
+    def is_sticky(self, request):
+        if request.COOKIES.get(self.cookie_name):
+            return True
+        key = self.get_request_key(request)
+        return key is not None and cache.get(key) is not None
+
+    def __call__(self, request):
+        request._db_read_token = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request._db_read_token is not None:
+                reset_read_database(request._db_read_token)
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and settings.REPLICA_DATABASES
+        ):
+            timeout = settings.DB_STICKY_SECONDS
+            keys = self.get_issued_keys(response)
+            key = self.get_request_key(request)
+            if key is not None:
+                keys.append(key)
+            if keys:
+                cache.set_many(dict.fromkeys(keys, 1), timeout)
+            response.set_cookie(
+                self.cookie_name, '1', max_age=timeout, httponly=True,
+                samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None or (
+            f'{view_class.__module__}.{view_class.__name__}'
+            not in settings.REPLICA_VIEWS
+        ):
+            return
+        replica = choose_replica()
+        if replica is not None and not self.is_sticky(request):
+            if hasattr(request, 'user'):
+                # Юзер сессии загружается до переключения на реплику.
+                request.user = get_user(request)
+            request._db_read_token = set_read_database(replica)
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы gzip или brotli по Accept-Encoding. Ответы на
+    анонимные GET-запросы к путям из RESPONSE_CACHE_RULES хранятся
+    в кеше вместе со сжатыми вариантами тела: каждый вариант
+    сжимается один раз, а не при каждом обращении. В ключ входит
+    версия рецептов, поэтому запись рецепта сбрасывает кеш, а в записи
+    хранится представление для меток метрик.
+    """
+    cached_headers_excluded = ('Content-Length', 'Content-Encoding')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rules = [
+            (re.compile(pattern), timeout)
+            for pattern, timeout in settings.RESPONSE_CACHE_RULES
+        ]
+
+    def get_cache_timeout(self, request):
+        if (
+            request.method != 'GET'
+            or 'HTTP_AUTHORIZATION' in request.META
+            or request.user.is_authenticated
+        ):
+            return None
+        for pattern, timeout in self.rules:
+            if pattern.match(request.path_info):
+                return timeout
+        return None
+
+    @staticmethod
+    def get_cache_key(request):
+        url = request.build_absolute_uri()
+        accept = request.META.get('HTTP_ACCEPT', '')
+        digest = hashlib.sha1(f'{url}\n{accept}'.encode()).hexdigest()
+        return f'response:{get_recipes_version()}:{digest}'
+
+    @staticmethod
+    def is_cacheable(response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and response.get('Content-Type', '').startswith(
+                'application/json'
+            )
+            and 'private' not in response.get('Cache-Control', '')
+        )
+
+    def __call__(self, request):
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        timeout = self.get_cache_timeout(request)
+        if timeout is None:
+            return self.compress_response(self.get_response(request),
+                                          encoding)
+        key = self.get_cache_key(request)
+        entry = cache.get(key)
+        observe_cache('responses', entry is not None)
+        if entry is None:
+            response = self.get_response(request)
+            if not self.is_cacheable(response):
+                return self.compress_response(response, encoding)
+            entry = {
+                'headers': [
+                    (name, value) for name, value in response.items()
+                    if name not in self.cached_headers_excluded
+                ],
+                'body': response.content,
+                'compressible': is_compressible(response),
+                'encoded': {},
+                'view': getattr(request, '_metrics_view', ('unmatched', '')),
+            }
+            changed = True
+        else:
+            request._metrics_view = entry['view']
+            changed = False
+        if not entry['compressible']:
+            encoding = None
+        if encoding and encoding not in entry['encoded']:
+            entry['encoded'][encoding] = compress(
+                entry['body'], encoding, cached=True
+            )
+            changed = True
+        if changed:
+            cache.set(key, entry, timeout)
+        return self.build_response(entry, encoding)
+
+    @staticmethod
+    def build_response(entry, encoding):
+        response = HttpResponse(
+            entry['encoded'][encoding] if encoding else entry['body']
+        )
+        for name, value in entry['headers']:
+            response[name] = value
+        if entry['compressible']:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Content-Length'] = str(len(response.content))
+        return response
+
+    @staticmethod
+    def compress_response(response, encoding):
+        if not is_compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if encoding:
+            response.content = compress(response.content, encoding)
+            response['Content-Encoding'] = encoding
+            response['Content-Length'] = str(len(response.content))
+        return response
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import migrations
+
+# Индексы upper() из моделей работают на любой БД. На PostgreSQL
+# с локалью, отличной от C, LIKE 'префикс%' (istartswith в админке)
+# использует только индекс с классом операторов varchar_pattern_ops,
+# поэтому там дополнительно создаются такие индексы.
+INDEXES = (
+    ('user_username_pattern_idx', settings.AUTH_USER_MODEL, 'username'),
+    ('user_email_pattern_idx', settings.AUTH_USER_MODEL, 'email'),
+    ('ingredient_name_pattern_idx', 'recipes.Ingredient', 'name'),
+    ('recipe_name_pattern_idx', 'recipes.Recipe', 'name'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    quote = schema_editor.quote_name
+    for name, model, column in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {quote(name)} ON '
+            f'{quote(apps.get_model(model)._meta.db_table)} '
+            f'((UPPER({quote(column)})) varchar_pattern_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in INDEXES:
+        schema_editor.execute(
+            f'DROP INDEX IF EXISTS {schema_editor.quote_name(name)}'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '__first__'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.db import migrations
+
+# Поиск юзеров на PostgreSQL ищет по началу lower() полей через
+# LIKE 'префикс%', для этого нужны индексы varchar_pattern_ops, и по
+# подстроке username - триграммный GIN из расширения pg_trgm. На других
+# БД поиск идет условием-диапазоном по индексам lower() из модели.
+PREFIX_INDEXES = (
+    ('user_username_prefix_idx', 'username'),
+    ('user_first_name_prefix_idx', 'first_name'),
+    ('user_last_name_prefix_idx', 'last_name'),
+)
+TRIGRAM_INDEX = 'user_username_trgm_idx'
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    quote = schema_editor.quote_name
+    table = quote(apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table)
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, column in PREFIX_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {quote(name)} ON {table} '
+            f'((LOWER({quote(column)})) varchar_pattern_ops)'
+        )
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {quote(TRIGRAM_INDEX)} ON {table} '
+        f'USING gin ((LOWER({quote("username")})) gin_trgm_ops)'
+    )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in [name for name, _ in PREFIX_INDEXES] + [TRIGRAM_INDEX]:
+        schema_editor.execute(
+            f'DROP INDEX IF EXISTS {schema_editor.quote_name(name)}'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0001_postgres_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -1,7 +1,203 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+MAX_BIGINT = 2 ** 63 - 1
 
 
 class MyPaginator(PageNumberPagination):
     """PageNumberPagination которая ограничивается limit."""
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class KeysetPaginator(CursorPagination):
+    """
+    Keyset-пагинация по полям ordering ('-' - по убыванию): курсор хранит
+    значения крайней строки страницы и направление, соседняя страница
+    выбирается условием по ним без OFFSET. Значения полей должны
+    сериализоваться в JSON, последнее поле - уникальное. position_types -
+    типы значений полей в курсоре, курсор с другими типами отклоняется.
+    """
+    position_types = ()
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+        rows = self.fetch(queryset, position, reverse, page_size + 1)
+        has_more = len(rows) > page_size
+        page = rows[:page_size]
+        if reverse:
+            page.reverse()
+        self.next_position = self.previous_position = None
+        if page:
+            if has_more if not reverse else position is not None:
+                self.next_position = self.get_position(page[-1])
+            if has_more if reverse else position is not None:
+                self.previous_position = self.get_position(page[0])
+        return page
+
+    def get_ordering(self, reverse):
+        if not reverse:
+            return self.ordering
+        return tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        )
+
+    def fetch(self, queryset, position, reverse, limit):
+        """Первые limit строк после позиции в заданном направлении."""
+        ordering = self.get_ordering(reverse)
+        if position is not None:
+            queryset = queryset.filter(self.after_q(ordering, position))
+        return list(queryset.order_by(*ordering)[:limit])
+
+    @staticmethod
+    def after_q(ordering, position):
+        """
+        Строки после позиции: (a > x) or (a = x and b > y) or ...
+        Лишнее условие a >= x позволяет начать просмотр индекса с позиции.
+        """
+        names = [field.lstrip('-') for field in ordering]
+        lookups = [
+            'lt' if field.startswith('-') else 'gt' for field in ordering
+        ]
+        condition = Q()
+        for index, name in enumerate(names):
+            equal = dict(zip(names[:index], position[:index]))
+            condition |= Q(
+                **equal, **{f'{name}__{lookups[index]}': position[index]}
+            )
+        return Q(**{f'{names[0]}__{lookups[0]}e': position[0]}) & condition
+
+    def get_position(self, row):
+        return [getattr(row, field.lstrip('-')) for field in self.ordering]
+
+    def parse_position(self, position):
+        """Значения полей из курсора, при ошибке - ValueError."""
+        if len(position) != len(self.ordering) or not all(
+            self.valid_value(value, value_type)
+            for value, value_type in zip(position, self.position_types)
+        ):
+            raise ValueError(position)
+        return position
+
+    @staticmethod
+    def valid_value(value, value_type):
+        """Значение из курсора, которое можно передать в БД."""
+        if type(value) is not value_type:
+            return False
+        if value_type is int:
+            return -MAX_BIGINT <= value <= MAX_BIGINT
+        if value_type is str:
+            return '\x00' not in value
+        return True
+
+    def decode_cursor(self, request):
+        """Позиция и направление из курсора (None, False без курсора)."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()))
+            if not isinstance(cursor, dict) or not isinstance(
+                cursor.get('p'), list
+            ):
+                raise ValueError(cursor)
+            return self.parse_position(cursor['p']), bool(cursor.get('r'))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position, reverse):
+        cursor = {'p': position}
+        if reverse:
+            cursor['r'] = 1
+        return replace_query_param(
+            self.base_url, self.cursor_query_param,
+            urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+        )
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class FeedPaginator(KeysetPaginator):
+    """
+    Keyset-пагинация ленты подписок, новые рецепты сначала. Принимает
+    несколько queryset со строками (pub_date, recipe_id): страница каждого
+    выбирается по его индексу, затем страницы сливаются. Источники не
+    должны пересекаться.
+    """
+    ordering = ('-pub_date', '-recipe_id')
+    position_types = (str, int)
+
+    def fetch(self, querysets, position, reverse, limit):
+        rows = []
+        for queryset in querysets:
+            rows.extend(super().fetch(
+                queryset.values('pub_date', 'recipe_id'),
+                position, reverse, limit
+            ))
+        rows.sort(
+            key=lambda row: (row['pub_date'], row['recipe_id']),
+            reverse=not reverse
+        )
+        return rows[:limit]
+
+    def get_position(self, row):
+        return [row['pub_date'].isoformat(), row['recipe_id']]
+
+    def parse_position(self, position):
+        pub_date, recipe_id = super().parse_position(position)
+        pub_date = parse_datetime(pub_date)
+        if pub_date is None:
+            raise ValueError(position)
+        return [pub_date, recipe_id]
+
+
+class UserSearchPaginator(KeysetPaginator):
+    """
+    Keyset-пагинация результатов поиска юзеров. Как и в остальных
+    списках юзеров, в ответе есть count - число найденных юзеров.
+    """
+    ordering = ('search_rank', 'username_lower', 'id')
+    position_types = (int, str, int)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,30 @@
+import json
+
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """
+    multipart/form-data, в котором вложенные поля (перечислены
+    в multipart_json_fields представления) переданы строками JSON.
+    Файлы Django пишет на диск частями, в памяти они не копятся.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        result = super().parse(stream, media_type, parser_context)
+        view = (parser_context or {}).get('view')
+        json_fields = getattr(view, 'multipart_json_fields', ())
+        data = {}
+        for key in result.data:
+            values = result.data.getlist(key)
+            if key in json_fields:
+                try:
+                    data[key] = json.loads(values[0])
+                except ValueError:
+                    raise ParseError(f'Поле {key} должно содержать JSON.')
+            else:
+                data[key] = values[0] if len(values) == 1 else values
+        data.update(result.files.dict())
+        return DataAndFiles(data, MultiValueDict())
@@ -0,0 +1,138 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import DatabaseError
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import get_error_detail
+
+from recipes.bulk import discard_images, insert_recipes
+from recipes.models import Ingredient, Recipe, Tag
+
+from .fields import RecipeImageField
+from .serializers import RecipeBulkItemSerializer
+
+
+def _missing_error(ids):
+    return [
+        f'Недопустимый первичный ключ "{value}" - объект не существует.'
+        for value in ids
+    ]
+
+
+def validate_items(data):
+    """
+    Проверка пачки рецептов: поля каждого рецепта отдельно, ссылки
+    на теги и ингредиенты - одним запросом на всю пачку.
+    Возвращает ({индекс: данные}, {индекс: ошибки}).
+    """
+    valid, errors = {}, {}
+    for index, item in enumerate(data):
+        serializer = RecipeBulkItemSerializer(data=item)
+        if serializer.is_valid():
+            valid[index] = serializer.validated_data
+        else:
+            errors[index] = serializer.errors
+    tag_ids = {tag for item in valid.values() for tag in item['tags']}
+    ingredient_ids = {
+        ingredient['id']
+        for item in valid.values() for ingredient in item['ingredients']
+    }
+    known_tags = set(
+        Tag.objects.filter(id__in=tag_ids).values_list('id', flat=True)
+    )
+    known_ingredients = set(
+        Ingredient.objects.filter(id__in=ingredient_ids)
+        .values_list('id', flat=True)
+    )
+    for index, item in list(valid.items()):
+        item_errors = {}
+        missing_tags = [tag for tag in item['tags'] if tag not in known_tags]
+        if missing_tags:
+            item_errors['tags'] = _missing_error(missing_tags)
+        missing_ingredients = [
+            ingredient['id'] for ingredient in item['ingredients']
+            if ingredient['id'] not in known_ingredients
+        ]
+        if missing_ingredients:
+            item_errors['ingredients'] = _missing_error(missing_ingredients)
+        if item_errors:
+            errors[index] = item_errors
+            del valid[index]
+    return valid, errors
+
+
+def _save_image(value):
+    """Декодировать, проверить и сохранить изображение в хранилище."""
+    field = Recipe._meta.get_field('image')
+    try:
+        image = RecipeImageField().to_internal_value(value)
+    except ValidationError as error:
+        return None, {'image': error.detail}
+    except DjangoValidationError as error:
+        return None, {'image': get_error_detail(error)}
+    return field.storage.save(
+        field.generate_filename(None, image.name), image
+    ), None
+
+
+def save_images(valid, errors):
+    """Изображения пачки обрабатываются в пуле BULK_IMAGE_WORKERS потоков."""
+    with ThreadPoolExecutor(
+        max_workers=settings.BULK_IMAGE_WORKERS,
+        thread_name_prefix='foodgram-bulk-image',
+    ) as pool:
+        results = list(pool.map(
+            _save_image, [item['image'] for item in valid.values()]
+        ))
+    images = {}
+    for index, (name, error) in zip(list(valid), results):
+        if error:
+            errors[index] = error
+            del valid[index]
+        else:
+            images[index] = name
+    return images
+
+
+def create_recipes_bulk(data, author):
+    """
+    Пакетное создание рецептов: проверка, изображения в пуле потоков,
+    вставка блоками по BULK_CREATE_CHUNK_SIZE в отдельных транзакциях.
+    Возвращает список созданных {index, id} и ошибки по индексам.
+    """
+    valid, errors = validate_items(data)
+    images = save_images(valid, errors)
+    created = []
+    indexes = list(valid)
+    chunk_size = settings.BULK_CREATE_CHUNK_SIZE
+    for start in range(0, len(indexes), chunk_size):
+        chunk = indexes[start:start + chunk_size]
+        entries = []
+        for index in chunk:
+            item = dict(valid[index])
+            tag_ids = item.pop('tags')
+            ingredients = item.pop('ingredients')
+            item['image'] = images[index]
+            entries.append((
+                Recipe(author=author, **item),
+                tag_ids,
+                [
+                    (ingredient['id'], ingredient['amount'])
+                    for ingredient in ingredients
+                ],
+            ))
+        try:
+            recipes = insert_recipes(entries)
+        except DatabaseError as error:
+            discard_images(images[index] for index in chunk)
+            for index in chunk:
+                errors[index] = {'non_field_errors': [str(error)]}
+            continue
+        created.extend(
+            {'index': index, 'id': recipe.id}
+            for index, recipe in zip(chunk, recipes)
+        )
+    return created, [
+        {'index': index, 'errors': errors[index]} for index in sorted(errors)
+    ]
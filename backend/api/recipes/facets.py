@@ -0,0 +1,96 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+
+from api.metrics import observe_cache
+from recipes.models import Recipe, Tag
+
+FACETS_CACHE_PREFIX = 'recipes:facets'
+IGNORED_PARAMS = ('page', 'limit', 'cursor', 'facets', 'fields', 'omit')
+USER_PARAMS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def get_signature(request):
+    """
+    Ключ кеша для набора фильтров: параметры запроса без пагинации
+    и формата ответа, а для фильтров по спискам юзера еще и его id.
+    """
+    params = sorted(
+        (key, sorted(values))
+        for key, values in request.query_params.lists()
+        if key not in IGNORED_PARAMS
+    )
+    if request.user.is_authenticated and any(
+        key in USER_PARAMS for key, _ in params
+    ):
+        params.append(('user', [str(request.user.id)]))
+    digest = hashlib.sha1(repr(params).encode()).hexdigest()
+    return f'{FACETS_CACHE_PREFIX}:{digest}'
+
+
+def get_buckets():
+    """Границы корзин cooking_time: [(min, max), ...], max=None - без края."""
+    bounds = settings.FACETS_COOKING_TIME_BUCKETS
+    lower = [1] + [bound + 1 for bound in bounds]
+    upper = list(bounds) + [None]
+    return list(zip(lower, upper))
+
+
+def compute_facets(queryset):
+    """
+    Счетчики по тегам и корзинам cooking_time одним GROUP BY: группы -
+    корзины, внутри них условные COUNT по каждому тегу. Через
+    подзапрос по id, чтобы фильтр по тегам не сужал счетчики тегов.
+    """
+    tags = list(Tag.objects.values('id', 'name', 'slug'))
+    buckets = get_buckets()
+    bucket = Case(
+        *[
+            When(cooking_time__lte=upper, then=Value(index))
+            for index, (_, upper) in enumerate(buckets[:-1])
+        ],
+        default=Value(len(buckets) - 1),
+        output_field=IntegerField(),
+    )
+    rows = (
+        Recipe.objects
+        .filter(id__in=queryset.order_by().values('id'))
+        .annotate(bucket=bucket)
+        .order_by()
+        .values('bucket')
+        .annotate(
+            total=Count('id', distinct=True),
+            **{
+                f'tag_{tag["id"]}': Count('id', filter=Q(tags=tag['id']))
+                for tag in tags
+            }
+        )
+    )
+    totals = [0] * len(buckets)
+    tag_counts = {tag['id']: 0 for tag in tags}
+    for row in rows:
+        totals[row['bucket']] = row['total']
+        for tag in tags:
+            tag_counts[tag['id']] += row[f'tag_{tag["id"]}']
+    return {
+        'tags': [
+            dict(tag, count=tag_counts[tag['id']]) for tag in tags
+        ],
+        'cooking_time': [
+            {'min': lower, 'max': upper, 'count': total}
+            for (lower, upper), total in zip(buckets, totals)
+        ],
+    }
+
+
+def get_facets(request, queryset):
+    """Фасеты для текущей выборки RecipeFilter с кешем по сигнатуре."""
+    key = get_signature(request)
+    facets = cache.get(key)
+    observe_cache('facets', facets is not None)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, settings.FACETS_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,32 @@
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
+from rest_framework.fields import FileField, ImageField
+
+from recipes.images import validate_image
+
+
+class HeaderValidatedImageField(ImageField):
+    """
+    ImageField, который проверяет изображение по заголовку файла,
+    не декодируя его целиком.
+    """
+
+    def to_internal_value(self, data):
+        file_object = FileField.to_internal_value(self, data)
+        validate_image(file_object)
+        return file_object
+
+
+class RecipeImageField(Base64FieldMixin, HeaderValidatedImageField):
+    """
+    Изображение рецепта: файл из multipart-запроса или, для совместимости,
+    строка Base64 внутри JSON.
+    """
+    ALLOWED_TYPES = Base64ImageField.ALLOWED_TYPES
+    INVALID_FILE_MESSAGE = Base64ImageField.INVALID_FILE_MESSAGE
+    INVALID_TYPE_MESSAGE = Base64ImageField.INVALID_TYPE_MESSAGE
+    get_file_extension = Base64ImageField.get_file_extension
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            return super().to_internal_value(data)
+        return HeaderValidatedImageField.to_internal_value(self, data)
@@ -1,7 +1,12 @@
-from django_filters.rest_framework import (BooleanFilter, FilterSet, filters,
-                                           ModelMultipleChoiceFilter)
+from django.conf import settings
+from django.db.models import Count, Exists, OuterRef
+from django_filters.rest_framework import (BooleanFilter, ChoiceFilter,
+                                           FilterSet, filters,
+                                           ModelMultipleChoiceFilter,
+                                           NumberFilter)
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.toggles import membership_q
 
 
 class IngredientFilter(FilterSet):
@@ -21,8 +26,12 @@ class RecipeFilter(FilterSet):
     tags = ModelMultipleChoiceFilter(
         queryset=Tag.objects.all(),
         field_name='tags__slug',
-        to_field_name='slug'
-
+        to_field_name='slug',
+        method='filter_tags'
+    )
+    tags_match = ChoiceFilter(
+        choices=(('any', 'Любой из тегов'), ('all', 'Все теги')),
+        method='filter_tags_match'
     )
     is_favorited = BooleanFilter(
         method='filter_is_favorited'
@@ -30,11 +39,49 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = BooleanFilter(
         method='filter_shopping_cart'
     )
+    cooking_time_min = NumberFilter(
+        field_name='cooking_time',
+        lookup_expr='gte'
+    )
+    cooking_time_max = NumberFilter(
+        field_name='cooking_time',
+        lookup_expr='lte'
+    )
+    ordering = ChoiceFilter(
+        choices=(('popular', 'По популярности'),),
+        method='filter_ordering'
+    )
+
+    def filter_tags(self, queryset, name, value):
+        """
+        Фильтр по тегам через EXISTS-подзапрос вместо JOIN: строки
+        рецептов не размножаются и не нужен DISTINCT. По умолчанию
+        рецепт должен иметь любой из тегов, с tags_match=all - все.
+        """
+        if not value:
+            return queryset
+        tag_ids = {tag.id for tag in value}
+        links = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag_id__in=tag_ids
+        )
+        if self.form.cleaned_data.get('tags_match') == 'all':
+            links = (
+                links.values('recipe')
+                .annotate(matched=Count('tag_id'))
+                .filter(matched=len(tag_ids))
+            )
+        return queryset.filter(Exists(links))
+
+    def filter_tags_match(self, queryset, name, value):
+        """Режим сопоставления тегов применяется в filter_tags."""
+        return queryset
 
     def filter_is_favorited(self, queryset, name, value):
         """Фильтр определяет, добавлен ли рецепт в избранное юзера."""
         user = self.request.user
         if value and user.is_authenticated:
+            if settings.TOGGLE_WRITE_BEHIND:
+                return queryset.filter(membership_q(user, Favorite))
             return queryset.filter(favorite__user=user)
 
         return queryset
@@ -43,10 +90,21 @@ class RecipeFilter(FilterSet):
         """Фильтр определяет, добавлен ли рецепт в корзину юзера."""
         user = self.request.user
         if value and user.is_authenticated:
+            if settings.TOGGLE_WRITE_BEHIND:
+                return queryset.filter(membership_q(user, ShoppingCart))
             return queryset.filter(shopping_list__user=user)
 
         return queryset
 
+    def filter_ordering(self, queryset, name, value):
+        """Сортировка по популярности с затуханием (индекс popularity)."""
+        if value == 'popular':
+            return queryset.order_by('-popularity', '-pub_date')
+
+        return queryset
+
     class Meta:
         model = Recipe
-        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
+        fields = ['author', 'tags', 'tags_match', 'is_favorited',
+                  'is_in_shopping_cart', 'cooking_time_min',
+                  'cooking_time_max', 'ordering']
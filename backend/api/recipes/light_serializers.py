@@ -0,0 +1,180 @@
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+
+from recipes.images import variants_srcset
+from recipes.models import Recipe, RecipeIngredient
+from users.models import Subscription
+
+User = get_user_model()
+
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+RECIPE_FIELDS = (
+    'id', 'tags', 'author', 'ingredients', 'is_favorited',
+    'is_in_shopping_cart', 'name', 'image', 'image_srcset', 'text',
+    'cooking_time',
+)
+RECIPE_COLUMNS = {
+    'author': 'author_id',
+    'name': 'name',
+    'image': 'image',
+    'image_srcset': 'image_variants',
+    'text': 'text',
+    'cooking_time': 'cooking_time',
+}
+RECIPE_SHORT_FIELDS = ('id', 'name', 'image', 'image_variants',
+                       'cooking_time')
+AUTHOR_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name')
+FLAG_FIELDS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def _url_builder(request):
+    return request.build_absolute_uri if request is not None else str
+
+
+def _image_url(name, build_url):
+    if not name:
+        return None
+    return build_url(default_storage.url(name))
+
+
+def tag_rows(queryset):
+    """Данные TagSerializer(many=True)."""
+    return list(queryset.values(*TAG_FIELDS))
+
+
+def recipe_values(queryset, fields=RECIPE_FIELDS, extra_columns=()):
+    """
+    Строки рецептов только с колонками, нужными для полей fields,
+    и аннотациями избранного и корзины, если они есть.
+    """
+    annotations = queryset.query.annotations
+    columns = ['id', *extra_columns]
+    columns.extend(
+        RECIPE_COLUMNS[field] for field in fields if field in RECIPE_COLUMNS
+    )
+    columns.extend(
+        field for field in FLAG_FIELDS
+        if field in fields and field in annotations
+    )
+    return queryset.prefetch_related(None).values(*columns)
+
+
+def _tags_by_recipe(recipe_ids):
+    tags = defaultdict(list)
+    rows = (
+        Recipe.tags.through.objects
+        .filter(recipe_id__in=recipe_ids)
+        .order_by('tag__name')
+        .values_list('recipe_id', *(f'tag__{f}' for f in TAG_FIELDS))
+    )
+    for recipe_id, *values in rows:
+        tags[recipe_id].append(dict(zip(TAG_FIELDS, values)))
+    return tags
+
+
+def _ingredients_by_recipe(recipe_ids):
+    ingredients = defaultdict(list)
+    rows = (
+        RecipeIngredient.objects
+        .filter(recipe_id__in=recipe_ids)
+        .order_by('id')
+        .values_list('recipe_id', 'ingredient_id', 'ingredient__name',
+                     'amount')
+    )
+    for recipe_id, ingredient_id, name, amount in rows:
+        ingredients[recipe_id].append(
+            {'id': ingredient_id, 'name': name, 'amount': amount}
+        )
+    return ingredients
+
+
+def _authors(author_ids, user):
+    subscribed = set()
+    if user is not None and user.is_authenticated:
+        subscribed = set(
+            Subscription.objects
+            .filter(user=user, author_id__in=author_ids)
+            .values_list('author_id', flat=True)
+        )
+    return {
+        row['id']: dict(row, is_subscribed=row['id'] in subscribed)
+        for row in User.objects.filter(id__in=author_ids)
+        .values(*AUTHOR_FIELDS)
+    }
+
+
+def recipe_rows(rows, request, fields=RECIPE_FIELDS):
+    """
+    Данные RecipeSerializer(many=True) для строк recipe_values():
+    связанные теги, ингредиенты и авторы читаются одним запросом каждые
+    и только если соответствующее поле запрошено.
+    """
+    rows = list(rows)
+    recipe_ids = [row['id'] for row in rows]
+    tags = _tags_by_recipe(recipe_ids) if 'tags' in fields else {}
+    ingredients = (
+        _ingredients_by_recipe(recipe_ids)
+        if 'ingredients' in fields else {}
+    )
+    authors = _authors(
+        {row['author_id'] for row in rows},
+        getattr(request, 'user', None)
+    ) if 'author' in fields else {}
+    build_url = _url_builder(request)
+    getters = {
+        'id': lambda row: row['id'],
+        'tags': lambda row: tags[row['id']],
+        'author': lambda row: authors[row['author_id']],
+        'ingredients': lambda row: ingredients[row['id']],
+        'is_favorited': lambda row: bool(row.get('is_favorited', False)),
+        'is_in_shopping_cart': lambda row: bool(
+            row.get('is_in_shopping_cart', False)
+        ),
+        'name': lambda row: row['name'],
+        'image': lambda row: _image_url(row['image'], build_url),
+        'image_srcset': lambda row: variants_srcset(
+            row['image_variants'], build_url
+        ),
+        'text': lambda row: row['text'],
+        'cooking_time': lambda row: row['cooking_time'],
+    }
+    getters = [(field, getters[field]) for field in fields]
+    return [
+        {field: getter(row) for field, getter in getters}
+        for row in rows
+    ]
+
+
+def _short_row(row, build_url):
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'image': _image_url(row['image'], build_url),
+        'image_srcset': variants_srcset(row['image_variants'], build_url),
+        'cooking_time': row['cooking_time'],
+    }
+
+
+def recipe_short_rows(queryset, request):
+    """Данные RecipeShortSerializer(many=True) из строк .values()."""
+    build_url = _url_builder(request)
+    return [
+        _short_row(row, build_url)
+        for row in queryset.values(*RECIPE_SHORT_FIELDS)
+    ]
+
+
+def recipe_short_rows_by_author(author_ids, request):
+    """Данные RecipeShortSerializer, сгруппированные по авторам."""
+    recipes = defaultdict(list)
+    build_url = _url_builder(request)
+    rows = (
+        Recipe.objects
+        .filter(author_id__in=author_ids, deleted_at__isnull=True)
+        .values('author_id', *RECIPE_SHORT_FIELDS)
+    )
+    for row in rows:
+        recipes[row['author_id']].append(_short_row(row, build_url))
+    return recipes
@@ -5,16 +5,23 @@ from drf_extra_fields.fields import Base64ImageField
 from rest_framework import validators
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.serializers import (
-    BooleanField, IntegerField, ModelSerializer,
+    BooleanField, CharField, IntegerField, ListField, ModelSerializer,
     PrimaryKeyRelatedField, SerializerMethodField, ReadOnlyField,
     ValidationError
 )
 
 from api.users.serializers import UserSerializer
+from recipes.feed import fan_out_recipe
+from recipes.images import variants_srcset
+from recipes.ingredient_index import update_index_on_commit
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
+from recipes.similarity import schedule_update
+from recipes.tasks import run_on_commit
 from users.models import Subscription
 
+from .fields import RecipeImageField
+
 
 User = get_user_model()
 
@@ -63,7 +70,58 @@ class RecipeIngredientCreateSerializer(ModelSerializer):
         fields = ('id', 'amount', )
 
 
-class RecipeSerializer(ModelSerializer):
+def get_requested_fields(request, available):
+    """
+    Поля ответа с учетом параметров запроса ?fields= (оставить только
+    перечисленные) и ?omit= (исключить перечисленные).
+    """
+    params = getattr(request, 'query_params', None)
+    if params is None:
+        params = getattr(request, 'GET', {})
+    selected = list(available)
+    for param in ('fields', 'omit'):
+        value = params.get(param)
+        if not value:
+            continue
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = names.difference(available)
+        if unknown:
+            raise ValidationError({
+                param: f'Неизвестные поля: {", ".join(sorted(unknown))}'
+            })
+        if param == 'fields':
+            selected = [name for name in selected if name in names]
+        else:
+            selected = [name for name in selected if name not in names]
+    return tuple(selected)
+
+
+class SparseFieldsMixin:
+    """Оставляет в ответе только поля, запрошенные через ?fields=/?omit=."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None:
+            return fields
+        return {
+            name: fields[name]
+            for name in get_requested_fields(request, fields)
+        }
+
+
+class ImageSrcsetMixin:
+    """Добавляет ссылки на уменьшенные копии изображения рецепта."""
+
+    def get_image_srcset(self, obj):
+        """Функция возвращает srcset для каждого формата изображения."""
+        request = self.context.get('request')
+        build_url = request.build_absolute_uri if request else str
+        return variants_srcset(obj.image_variants, build_url)
+
+
+class RecipeSerializer(SparseFieldsMixin, ImageSrcsetMixin,
+                       ModelSerializer):
     """Сериализатор для модели Recipe, предназначенный для "GET" запросов."""
     tags = TagSerializer(read_only=True, many=True)
     author = UserSerializer(read_only=True)
@@ -71,38 +129,21 @@ class RecipeSerializer(ModelSerializer):
         many=True, read_only=True, source='recipe_ingredients'
     )
     image = Base64ImageField()
+    image_srcset = SerializerMethodField()
     is_favorited = BooleanField(read_only=True, default=False)
     is_in_shopping_cart = BooleanField(read_only=True, default=False)
 
     class Meta:
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',
+            'is_in_shopping_cart', 'name', 'image', 'image_srcset', 'text',
+            'cooking_time',
         )
         model = Recipe
 
 
-class RecipePostSerializer(ModelSerializer):
-    """
-    Сериализатор для модели "Recipe" и предназначенный для обработки "POST"
-    запросов. В нем определены необходимые поля и методы для создания,
-    редактирования рецепта и добавления ингредиентов в него.
-    """
-    tags = PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True,
-    )
-    ingredients = RecipeIngredientCreateSerializer(many=True)
-    author = UserSerializer(read_only=True)
-    ingredients = RecipeIngredientCreateSerializer(many=True)
-    image = Base64ImageField()
-
-    class Meta:
-        model = Recipe
-        fields = (
-            'author', 'ingredients', 'tags',
-            'image', 'name', 'text', 'cooking_time',
-        )
+class RecipeValidationMixin:
+    """Проверки тегов и ингредиентов создаваемого рецепта."""
 
     def validate_ingredients(self, ingredients):
         """Функция проверяет наличие хотя бы одного ингредиента,
@@ -137,6 +178,29 @@ class RecipePostSerializer(ModelSerializer):
             )
         return tags
 
+
+class RecipePostSerializer(RecipeValidationMixin, ModelSerializer):
+    """
+    Сериализатор для модели "Recipe" и предназначенный для обработки "POST"
+    запросов. В нем определены необходимые поля и методы для создания,
+    редактирования рецепта и добавления ингредиентов в него.
+    """
+    tags = PrimaryKeyRelatedField(
+        queryset=Tag.objects.all(),
+        many=True,
+    )
+    ingredients = RecipeIngredientCreateSerializer(many=True)
+    author = UserSerializer(read_only=True)
+    ingredients = RecipeIngredientCreateSerializer(many=True)
+    image = RecipeImageField()
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'author', 'ingredients', 'tags',
+            'image', 'name', 'text', 'cooking_time',
+        )
+
     @transaction.atomic
     def add_ingredients(self, recipe, ingredients):
         """Функция добавления ингредиентов в рецепт, выполняется атомарно."""
@@ -151,6 +215,11 @@ class RecipePostSerializer(ModelSerializer):
                 )
             )
         RecipeIngredient.objects.bulk_create(ingredient_list_in_recipe)
+        update_index_on_commit(
+            recipe.id,
+            [ingredient_data['id'] for ingredient_data in ingredients]
+        )
+        schedule_update(recipe.id)
 
     @transaction.atomic
     def create(self, validated_data):
@@ -166,6 +235,7 @@ class RecipePostSerializer(ModelSerializer):
         recipe = Recipe.objects.create(author=author, **validated_data)
         recipe.tags.set(tags)
         self.add_ingredients(recipe, ingredients)
+        run_on_commit(fan_out_recipe, recipe.id)
         return recipe
 
     @transaction.atomic
@@ -173,8 +243,11 @@ class RecipePostSerializer(ModelSerializer):
         """Функция редактирования рецепта, выполняется атомарно."""
         tags = validated_data.pop('tags')
         if tags is not None:
+            old_tags = set(recipe.tags.values_list('id', flat=True))
             recipe.tags.clear()
             recipe.tags.set(tags)
+            if old_tags != {tag.id for tag in tags}:
+                schedule_update(recipe.id)
         ingredients = validated_data.pop('ingredients')
         if ingredients is not None:
             RecipeIngredient.objects.filter(recipe=recipe).delete()
@@ -186,14 +259,40 @@ class RecipePostSerializer(ModelSerializer):
         return RecipeSerializer(instance, context=self.context).data
 
 
-class RecipeShortSerializer(ModelSerializer):
+class RecipeBulkItemSerializer(RecipeValidationMixin, ModelSerializer):
+    """
+    Рецепт в пакетном создании. Теги и ингредиенты проверяются сразу
+    для всей пачки, изображение в Base64 декодируется в пуле потоков.
+    """
+    tags = ListField(child=IntegerField())
+    ingredients = RecipeIngredientCreateSerializer(many=True)
+    image = CharField()
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'ingredients', 'tags', 'image', 'name', 'text', 'cooking_time',
+        )
+
+
+class RecipeImageSerializer(ModelSerializer):
+    """Сериализатор для отдельной загрузки изображения рецепта."""
+    image = RecipeImageField()
+
+    class Meta:
+        model = Recipe
+        fields = ('image',)
+
+
+class RecipeShortSerializer(ImageSrcsetMixin, ModelSerializer):
     """Мини сериализатор для рецепта, который используется при добавлении
     в избранное и подписках.
     """
+    image_srcset = SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
 
 
 class FavoriteRecipeSerializer(ModelSerializer):
@@ -223,13 +322,19 @@ class ShoppingCartSerializer(ModelSerializer):
     class Meta:
         model = ShoppingCart
         fields = ('user', 'recipe',)
+        validators = [
+            validators.UniqueTogetherValidator(
+                queryset=ShoppingCart.objects.all(),
+                fields=['user', 'recipe'],
+            )
+        ]
 
 
 class UserSubscribeSerializer(ModelSerializer):
     """Сериализатор для модели User."""
     is_subscribed = SerializerMethodField()
-    recipes = RecipeShortSerializer(many=True)
-    recipes_count = ReadOnlyField(source='author.recipes.count')
+    recipes = SerializerMethodField()
+    recipes_count = SerializerMethodField()
 
     class Meta:
         model = User
@@ -255,6 +360,24 @@ class UserSubscribeSerializer(ModelSerializer):
             user=request.user, author=obj
         ).exists()
 
+    def get_recipes(self, obj):
+        """
+        Функция возвращает рецепты автора. Если рецепты всех авторов
+        страницы уже собраны в контексте, берет их оттуда.
+        """
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            return recipes_by_author.get(obj.id, [])
+        return RecipeShortSerializer(
+            obj.recipes.filter(deleted_at__isnull=True), many=True,
+            context=self.context
+        ).data
+
     def get_recipes_count(self, obj):
-        """Функция возвращает количество рецептов."""
-        return obj.recipes.count
+        """
+        Функция возвращает количество рецептов без помеченных удаленными.
+        Для списка подписок оно уже посчитано в queryset.
+        """
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        return obj.recipes.filter(deleted_at__isnull=True).count()
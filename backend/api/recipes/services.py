@@ -1,13 +1,26 @@
+from django.conf import settings
 from django.db.models import Sum
 
-from recipes.models import RecipeIngredient
+from recipes.models import Recipe, RecipeIngredient, ShoppingCart
+from recipes.toggles import membership_q
 
 
 def get_shopping_list(user):
     """Получить перечень покупок юзера"""
+    if settings.TOGGLE_WRITE_BEHIND:
+        recipes = Recipe.objects.filter(
+            membership_q(user, ShoppingCart), deleted_at__isnull=True
+        )
+        ingredients = RecipeIngredient.objects.filter(
+            recipe__in=recipes.values('id')
+        )
+    else:
+        ingredients = RecipeIngredient.objects.filter(
+            recipe__shopping_list__user=user,
+            recipe__deleted_at__isnull=True,
+        )
     ingredients = (
-        RecipeIngredient.objects
-        .filter(recipe__shopping_list__user=user)
+        ingredients
         .order_by('ingredient__name')
         .values('ingredient__name', 'ingredient__unit_of_measurement')
         .annotate(amount=Sum('amount'))
@@ -23,3 +36,24 @@ def get_shopping_list(user):
         )
 
     return '\n'.join(shopping_list)
+
+
+def pantry_candidates(ranked, queryset):
+    """
+    Рецепты из ranked (результат IngredientIndex.search), которые есть
+    в queryset с фильтрами запроса, в порядке ranked. Проверка идет
+    пачками по PANTRY_FILTER_CHUNK id и заканчивается, когда найдено
+    PANTRY_MAX_CANDIDATES рецептов.
+    """
+    candidates = []
+    chunk_size = settings.PANTRY_FILTER_CHUNK
+    for start in range(0, len(ranked), chunk_size):
+        chunk = ranked[start:start + chunk_size]
+        allowed = set(
+            queryset.filter(id__in=[item[0] for item in chunk])
+            .values_list('id', flat=True)
+        )
+        candidates.extend(item for item in chunk if item[0] in allowed)
+        if len(candidates) >= settings.PANTRY_MAX_CANDIDATES:
+            break
+    return candidates[:settings.PANTRY_MAX_CANDIDATES]
@@ -1,34 +1,64 @@
 from http import HTTPStatus
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db.models import Exists, OuterRef
+from django.utils.functional import cached_property
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
+from api.parsers import MultiPartJSONParser
 from api.permissions import IsAuthor
-from api.pagination import MyPaginator
+from api.pagination import FeedPaginator, MyPaginator
+from recipes.feed import feed_querysets
+from recipes.ingredient_index import ingredient_index
 from recipes.models import (Favorite, Ingredient, Recipe,
-                            ShoppingCart, Tag)
+                            ShoppingCart, SimilarRecipe, Tag)
+from recipes.popularity import change_popularity
+from recipes.purge import soft_delete_recipe
+from recipes.toggles import is_member, membership_annotation, toggle_buffer
 
+from .bulk import create_recipes_bulk
+from .facets import get_facets
 from .filters import IngredientFilter, RecipeFilter
+from .light_serializers import (recipe_rows, recipe_short_rows,
+                                recipe_values, tag_rows)
 from .serializers import (FavoriteRecipeSerializer, IngredientSerializer,
-                          RecipePostSerializer, RecipeSerializer,
-                          ShoppingCartSerializer, TagSerializer)
-from .services import get_shopping_list
+                          RecipeImageSerializer, RecipePostSerializer,
+                          RecipeSerializer, ShoppingCartSerializer,
+                          TagSerializer, get_requested_fields)
+from .services import get_shopping_list, pantry_candidates
 
 User = get_user_model()
 
 
+def duplicate_error(serializer_class):
+    """Та же ошибка, что у UniqueTogetherValidator сериализатора."""
+    validator = serializer_class.Meta.validators[0]
+    return ValidationError({
+        api_settings.NON_FIELD_ERRORS_KEY: [validator.message.format(
+            field_names=', '.join(validator.fields)
+        )]
+    }, code='unique')
+
+
 class TagViewSet(ReadOnlyModelViewSet):
     """Представление только для чтения информации о тегах."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
+    def list(self, request, *args, **kwargs):
+        """Функция для получения списка тегов без ModelSerializer."""
+        return Response(tag_rows(self.filter_queryset(self.get_queryset())))
+
 
 class IngredientViewSet(ReadOnlyModelViewSet):
     """Представление только для чтения информации об ингредиентах."""
@@ -48,6 +78,9 @@ class RecipeViewSet(ModelViewSet):
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
     pagination_class = MyPaginator
+    parser_classes = (JSONParser, MultiPartJSONParser)
+    multipart_json_fields = ('tags', 'ingredients')
+    throttle_scopes = {'download_shopping_cart': 'export'}
 
     def get_serializer_class(self):
         """Функция для определения класса сериализатора."""
@@ -55,49 +88,224 @@ class RecipeViewSet(ModelViewSet):
             return RecipeSerializer
         return RecipePostSerializer
 
-    def get_queryset(self):
-        """Функция для получения списка рецептов."""
-        queryset = (
-            Recipe.objects
-            .select_related('author')
-            .prefetch_related('ingredients', 'tags')
+    @cached_property
+    def requested_fields(self):
+        """Поля ответа, запрошенные через ?fields= и ?omit=."""
+        return get_requested_fields(
+            self.request, RecipeSerializer.Meta.fields
         )
+
+    def get_queryset(self):
+        """
+        Функция для получения списка рецептов. Связанные данные
+        и аннотации подгружаются только для запрошенных полей.
+        """
+        fields = self.requested_fields
+        queryset = Recipe.objects.filter(deleted_at__isnull=True)
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        if 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        if 'ingredients' in fields:
+            queryset = queryset.prefetch_related(
+                'recipe_ingredients__ingredient'
+            )
         user = self.request.user
 
         if user.is_authenticated:
-            favorite_qs = Favorite.objects.filter(
-                user=user, recipe=OuterRef('id')
+            annotations = {}
+            if 'is_favorited' in fields:
+                annotations['is_favorited'] = membership_annotation(
+                    user, Favorite
+                )
+            if 'is_in_shopping_cart' in fields:
+                annotations['is_in_shopping_cart'] = membership_annotation(
+                    user, ShoppingCart
+                )
+            queryset = queryset.annotate(**annotations)
+
+        return queryset
+
+    def perform_destroy(self, instance):
+        """
+        Рецепт помечается удаленным и сразу скрывается, связанные
+        с ним строки и изображение удаляются в фоне.
+        """
+        soft_delete_recipe(instance)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Функция для получения списка рецептов. Данные собираются
+        из .values() облегченной сериализацией. С ?facets=true
+        в ответ добавляются счетчики по тегам и времени приготовления.
+        """
+        fields = self.requested_fields
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(recipe_values(queryset, fields))
+        response = self.get_paginated_response(
+            recipe_rows(page, request, fields)
+        )
+        if request.query_params.get('facets') in ('1', 'true', 'True'):
+            response.data['facets'] = get_facets(request, queryset)
+        return response
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[IsAuthenticated],
+        pagination_class=FeedPaginator,
+    )
+    def feed(self, request):
+        """
+        Функция для получения рецептов авторов из подписок юзера.
+        Страница выбирается из таблицы ленты, рецепты читаются только
+        для нее.
+        """
+        fields = self.requested_fields
+        recipes = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(
+            feed_querysets(request.user, recipes)
+        )
+        ids = [row['recipe_id'] for row in page]
+        rows = {
+            row['id']: row for row in
+            recipe_values(recipes.filter(id__in=ids), fields)
+        }
+        return self.get_paginated_response(recipe_rows(
+            [rows[recipe_id] for recipe_id in ids if recipe_id in rows],
+            request, fields
+        ))
+
+    @action(detail=False, methods=['GET'])
+    def pantry(self, request):
+        """
+        Функция для подбора рецептов по имеющимся ингредиентам
+        (?ingredients=1,2,3). Рецепты упорядочены по доле имеющихся
+        ингредиентов и количеству недостающих, фильтры по тегам
+        и прочим параметрам RecipeFilter сохраняются.
+        """
+        try:
+            ingredient_ids = [
+                int(value)
+                for value in request.query_params.get(
+                    'ingredients', ''
+                ).split(',') if value.strip()
+            ]
+        except ValueError:
+            raise ValidationError(
+                {'ingredients': 'Укажите id ингредиентов через запятую.'}
             )
-            shopping_cart_qs = ShoppingCart.objects.filter(
-                user=user, recipe=OuterRef('id')
+        if not ingredient_ids:
+            raise ValidationError(
+                {'ingredients': 'Укажите хотя бы один ингредиент.'}
             )
-            queryset = queryset.annotate(
-                is_favorited=Exists(favorite_qs),
-                is_in_shopping_cart=Exists(shopping_cart_qs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(pantry_candidates(
+            ingredient_index.search(ingredient_ids), queryset
+        ))
+        fields = self.requested_fields
+        rows = {
+            row['id']: row
+            for row in recipe_values(
+                queryset.filter(id__in=[item[0] for item in page]), fields
             )
+        }
+        # Рецепт мог быть удален между запросами.
+        page = [item for item in page if item[0] in rows]
+        data = recipe_rows(
+            [rows[recipe_id] for recipe_id, _, _ in page], request, fields
+        )
+        for item, (_, coverage, missing) in zip(data, page):
+            item['coverage'] = round(coverage, 4)
+            item['missing_count'] = missing
+        return self.get_paginated_response(data)
 
-        return queryset
+    @action(
+        detail=False,
+        methods=['POST'],
+        permission_classes=[IsAuthenticated],
+        parser_classes=[JSONParser],
+    )
+    def bulk(self, request):
+        """
+        Функция для пакетного создания рецептов: принимает список
+        рецептов и возвращает id созданных и ошибки остальных по индексу.
+        """
+        data = request.data
+        if not isinstance(data, list) or not data:
+            raise ValidationError('Ожидается непустой список рецептов.')
+        if len(data) > settings.BULK_CREATE_MAX_ITEMS:
+            raise ValidationError(
+                f'Не более {settings.BULK_CREATE_MAX_ITEMS} рецептов '
+                f'за запрос.'
+            )
+        created, errors = create_recipes_bulk(data, request.user)
+        if not created:
+            status = HTTPStatus.BAD_REQUEST
+        elif errors:
+            status = HTTPStatus.MULTI_STATUS
+        else:
+            status = HTTPStatus.CREATED
+        return Response({'created': created, 'errors': errors}, status=status)
+
+    @action(detail=True, methods=['GET'])
+    def similar(self, request, pk):
+        """Функция для получения похожих рецептов."""
+        recipe = get_object_or_404(Recipe, id=pk, deleted_at__isnull=True)
+        scores = dict(
+            SimilarRecipe.objects
+            .filter(recipe=recipe)
+            .order_by('-score')
+            .values_list('similar_id', 'score')
+            [:settings.SIMILAR_RECIPES_TOP_K]
+        )
+        rows = {
+            row['id']: row
+            for row in recipe_short_rows(
+                Recipe.objects.filter(id__in=scores, deleted_at__isnull=True),
+                request
+            )
+        }
+        data = []
+        for recipe_id, score in sorted(
+            scores.items(), key=lambda item: -item[1]
+        ):
+            if recipe_id in rows:
+                data.append(dict(rows[recipe_id], score=round(score, 4)))
+        return Response(data)
 
     def add_to_list(self, request, pk, serializer_class):
         """Функция для добавления объекта в список."""
         context = {'request': request}
-        recipe = get_object_or_404(Recipe, id=pk)
+        recipe = get_object_or_404(Recipe, id=pk, deleted_at__isnull=True)
         data = {
             'user': request.user.id,
             'recipe': recipe.id
         }
+        if settings.TOGGLE_WRITE_BEHIND:
+            model = serializer_class.Meta.model
+            if is_member(request.user, model, recipe.id):
+                raise duplicate_error(serializer_class)
+            toggle_buffer.add(model, request.user.id, recipe.id, True)
+            return Response(data, status=HTTPStatus.CREATED)
         serializer = serializer_class(data=data, context=context)
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        change_popularity(recipe.id, serializer_class.Meta.model)
 
         return Response(serializer.data, status=HTTPStatus.CREATED)
 
     def remove_from_list(self, request, pk, Model, message):
         """Функция для удаления рецепта из списка."""
         user = request.user
-        recipe = get_object_or_404(Recipe, id=pk)
-        Model.objects.filter(user=user,
-                             recipe=recipe).delete()
+        recipe = get_object_or_404(Recipe, id=pk, deleted_at__isnull=True)
+        if settings.TOGGLE_WRITE_BEHIND:
+            toggle_buffer.add(Model, user.id, recipe.id, False)
+            return Response({'status': message}, status=HTTPStatus.OK)
+        deleted, _ = Model.objects.filter(user=user,
+                                          recipe=recipe).delete()
+        if deleted:
+            change_popularity(recipe.id, Model, sign=-1)
 
         return Response({'status': message}, status=HTTPStatus.OK)
 
@@ -133,6 +341,23 @@ class RecipeViewSet(ModelViewSet):
         return self.remove_from_list(request, pk, Favorite,
                                      'Рецепт удален из списка избранных')
 
+    @action(
+        detail=True,
+        methods=['POST'],
+        permission_classes=[IsAuthenticated, IsAuthor],
+        parser_classes=[MultiPartParser],
+    )
+    def image(self, request, pk):
+        """Функция для загрузки изображения рецепта файлом multipart."""
+        recipe = self.get_object()
+        serializer = RecipeImageSerializer(
+            recipe, data=request.data, context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        return Response(serializer.data, status=HTTPStatus.OK)
+
     @action(
         methods=['GET'],
         detail=False,
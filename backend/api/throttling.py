@@ -0,0 +1,127 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
+
+from .metrics import registry
+
+
+class LocalBuckets:
+    """
+    Корзины токенов в памяти процесса, не больше THROTTLE_LOCAL_MAX_KEYS.
+    Чтение и запись корзины идут под одной блокировкой, поэтому
+    одновременные запросы в потоках воркера не тратят один токен дважды.
+    При переполнении вытесняются корзины, которые дольше всех
+    не обновлялись (LRU): они скорее всего уже восстановились,
+    а активные клиенты сохраняют свое состояние.
+    """
+
+    def __init__(self):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, duration, now):
+        """Взять токен; None, если он есть, иначе секунды ожидания."""
+        refill = capacity / duration
+        with self._lock:
+            tokens, updated = self._buckets.get(key) or (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * refill)
+            if tokens < 1:
+                return (1 - tokens) / refill
+            self._buckets[key] = (tokens - 1, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > settings.THROTTLE_LOCAL_MAX_KEYS:
+                self._buckets.popitem(last=False)
+        return None
+
+
+class CacheBuckets:
+    """
+    Лимит в общем кеше воркеров скользящим окном: счетчики запросов
+    по окнам длиной duration, счетчик прошлого окна учитывается с весом
+    оставшейся от него доли. Счетчик текущего окна увеличивается
+    атомарно (cache.add + cache.incr), поэтому одновременные запросы
+    в разных воркерах не превышают лимит.
+    """
+
+    def take(self, key, capacity, duration, now):
+        """Учесть запрос; None, если он в лимите, иначе секунды ожидания."""
+        window = int(now // duration)
+        current_key = f'throttle:{key}:{window}'
+        cache.add(current_key, 0, duration * 2)
+        try:
+            count = cache.incr(current_key)
+        except ValueError:
+            # Счетчик вытеснен из кеша между add и incr.
+            cache.add(current_key, 0, duration * 2)
+            count = cache.incr(current_key)
+        previous = cache.get(f'throttle:{key}:{window - 1}', 0)
+        window_left = (window + 1) * duration - now
+        used = previous * window_left / duration + count
+        if used <= capacity:
+            return None
+        cache.decr(current_key)
+        if previous:
+            return min((used - capacity) * duration / previous, window_left)
+        return window_left
+
+
+local_buckets = LocalBuckets()
+cache_buckets = CacheBuckets()
+
+
+def get_buckets():
+    if settings.THROTTLE_BACKEND == 'cache':
+        return cache_buckets
+    return local_buckets
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Ограничение частоты запросов корзиной токенов: отдельно для
+    каждого юзера, для анонимов - по IP. Область (read, write, export)
+    берется из throttle_scopes представления по действию, иначе
+    определяется методом запроса. Отказы учитываются в метриках.
+    """
+    scope = None
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_scope(self, request, view):
+        scopes = getattr(view, 'throttle_scopes', {})
+        scope = scopes.get(getattr(view, 'action', None))
+        if scope:
+            return scope
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        return f'{self.scope}:{ident}'
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        rate = self.get_rate()
+        if rate is None:
+            return True
+        capacity, duration = self.parse_rate(rate)
+        wait = get_buckets().take(
+            self.get_cache_key(request, view), capacity, duration,
+            self.timer()
+        )
+        if wait is not None:
+            self.wait_seconds = wait
+            registry.inc(
+                'foodgram_throttled_requests_total', {'scope': self.scope}
+            )
+            return False
+        return True
+
+    def wait(self):
+        return self.wait_seconds
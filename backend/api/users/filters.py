@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Lower
+from rest_framework.filters import BaseFilterBackend
+
+# Символ больше любого другого: lower(поле) < префикс + MAX_CHAR
+# выбирает все строки, начинающиеся с префикса.
+MAX_CHAR = '\U0010ffff'
+
+
+class UserSearchFilter(BaseFilterBackend):
+    """
+    Поиск юзеров по префиксу username, имени и фамилии без учета
+    регистра (?search=). Сначала идут совпадения по username, затем
+    по имени и фамилии, на PostgreSQL - затем по подстроке username.
+    Ранг и lower(username) добавляются в queryset для keyset-пагинации.
+    """
+    search_param = 'search'
+    fields = ('username', 'first_name', 'last_name')
+
+    def get_search_term(self, request):
+        return request.query_params.get(self.search_param, '').strip().lower()
+
+    @staticmethod
+    def prefix_q(field, prefix, vendor):
+        """
+        На PostgreSQL LIKE 'префикс%' использует индекс varchar_pattern_ops,
+        на остальных БД условие-диапазон - функциональный индекс lower().
+        """
+        if vendor == 'postgresql':
+            return Q(**{f'{field}__startswith': prefix})
+        return Q(**{
+            f'{field}__gte': prefix, f'{field}__lt': prefix + MAX_CHAR
+        })
+
+    def filter_queryset(self, request, queryset, view):
+        term = self.get_search_term(request)
+        if not term:
+            return queryset
+        vendor = connections[queryset.db].vendor
+        queryset = queryset.annotate(**{
+            f'{field}_lower': Lower(field) for field in self.fields
+        })
+        username_q = self.prefix_q('username_lower', term, vendor)
+        names_q = (
+            self.prefix_q('first_name_lower', term, vendor)
+            | self.prefix_q('last_name_lower', term, vendor)
+        )
+        condition = username_q | names_q
+        if (
+            vendor == 'postgresql'
+            and len(term) >= settings.USER_SEARCH_CONTAINS_MIN_LENGTH
+        ):
+            condition |= Q(username_lower__contains=term)
+        return queryset.filter(condition).annotate(
+            search_rank=Case(
+                When(username_q, then=Value(0)),
+                When(names_q, then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField(),
+            )
+        )
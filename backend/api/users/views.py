@@ -2,19 +2,25 @@ from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Count, Q
 from djoser.views import UserViewSet
-from rest_framework import filters
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from api.pagination import MyPaginator
+from api.pagination import MyPaginator, UserSearchPaginator
+from recipes.feed import add_author_to_feed, remove_author_from_feed
+from recipes.purge import soft_delete_user
+from recipes.tasks import run_on_commit
 from users.models import Subscription
 
+from api.recipes.light_serializers import recipe_short_rows_by_author
 from api.recipes.serializers import UserSubscribeSerializer
 
+from .filters import UserSearchFilter
+
 User = get_user_model()
 
 
@@ -23,8 +29,30 @@ class UsersViewSet(UserViewSet):
     queryset = User.objects.all()
     pagination_class = MyPaginator
     permission_classes = (AllowAny, )
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['username']
+    filter_backends = [UserSearchFilter]
+
+    def get_queryset(self):
+        """Помеченные удаленными юзеры скрыты до фонового удаления."""
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+    @property
+    def paginator(self):
+        """Результаты поиска листаются keyset-пагинацией по рангу."""
+        if not hasattr(self, '_paginator'):
+            if self.action == 'list' and self.request.query_params.get(
+                UserSearchFilter.search_param
+            ):
+                self._paginator = UserSearchPaginator()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def perform_destroy(self, instance):
+        """
+        Юзер и его рецепты сразу скрываются, а удаляются
+        в фоне небольшими пачками.
+        """
+        soft_delete_user(instance)
 
     @action(
         detail=True,
@@ -33,7 +61,7 @@ class UsersViewSet(UserViewSet):
     )
     def subscribe(self, request, id):
         """Функция, которая создает подписку на другого автора."""
-        author = get_object_or_404(User, id=id)
+        author = get_object_or_404(User, id=id, deleted_at__isnull=True)
         user = request.user
         subscription = Subscription.objects.filter(
             user=user, author=author
@@ -41,6 +69,7 @@ class UsersViewSet(UserViewSet):
         if request.method == 'DELETE':
             try:
                 subscription.delete()
+                run_on_commit(remove_author_from_feed, user.id, author.id)
                 return Response(
                     f'Подписка на автора {author.username} удалена',
                     status=HTTPStatus.OK)
@@ -55,6 +84,7 @@ class UsersViewSet(UserViewSet):
             user=request.user,
             author=author
         )
+        run_on_commit(add_author_to_feed, user.id, author.id)
         serializer = UserSubscribeSerializer(
             author,
             context={'request': request},
@@ -70,9 +100,19 @@ class UsersViewSet(UserViewSet):
     def subscriptions(self, request):
         """Функция, которая возвращает список подписок юзера."""
         user = request.user
-        queryset = User.objects.filter(subscribers__user=user)
+        queryset = User.objects.filter(
+            subscribers__user=user, deleted_at__isnull=True
+        ).annotate(recipes_count=Count(
+            'recipes', filter=Q(recipes__deleted_at__isnull=True)
+        ))
         page = self.paginate_queryset(queryset)
+        recipes_by_author = recipe_short_rows_by_author(
+            [author.id for author in page], request
+        )
         serializer = UserSubscribeSerializer(
-            page, many=True, context={'request': request}
+            page, many=True, context={
+                'request': request,
+                'recipes_by_author': recipes_by_author,
+            }
         )
         return self.get_paginated_response(serializer.data)
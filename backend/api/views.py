@@ -0,0 +1,13 @@
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from .metrics import render_metrics
+
+
+@require_GET
+def metrics(request):
+    """Метрики всех воркеров в формате Prometheus."""
+    return HttpResponse(
+        render_metrics(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.db import connections
+
+
+def close_unusable_connections(**kwargs):
+    """
+    Проверка постоянных соединений в начале запроса: соединение,
+    разорванное сервером БД, закрывается до первого запроса к нему,
+    и Django открывает новое.
+    """
+    if not settings.DB_CONN_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        if not connection.is_usable():
+            connection.close()
@@ -0,0 +1,107 @@
+import os
+import threading
+
+import psycopg2
+import psycopg2.extras
+from django.conf import settings
+from django.db.backends.postgresql import base
+from psycopg2.pool import ThreadedConnectionPool
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Пул соединений процесса для одного алиаса БД. Сверх max_size
+    соединения ждут освобождения не дольше DB_POOL_TIMEOUT секунд.
+    """
+
+    def __init__(self, conn_params):
+        self.slots = threading.BoundedSemaphore(settings.DB_POOL_MAX_SIZE)
+        self.pool = ThreadedConnectionPool(
+            settings.DB_POOL_MIN_SIZE, settings.DB_POOL_MAX_SIZE,
+            **conn_params
+        )
+
+    def getconn(self):
+        if not self.slots.acquire(timeout=settings.DB_POOL_TIMEOUT):
+            raise psycopg2.OperationalError(
+                'Нет свободных соединений в пуле БД.'
+            )
+        try:
+            return self.get_alive_connection()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def get_alive_connection(self):
+        """
+        Соединение из пула, прошедшее проверку. Разорванные соединения
+        (например, после перезапуска БД их может быть несколько)
+        закрываются, пока не найдется живое или пул не опустеет
+        и не будет открыто новое.
+        """
+        for _ in range(settings.DB_POOL_MAX_SIZE + 1):
+            connection = self.pool.getconn()
+            if not settings.DB_CONN_HEALTH_CHECKS or is_alive(connection):
+                return connection
+            self.pool.putconn(connection, close=True)
+        raise psycopg2.OperationalError('Нет рабочих соединений в пуле БД.')
+
+    def putconn(self, connection):
+        try:
+            self.pool.putconn(connection, close=bool(connection.closed))
+        finally:
+            self.slots.release()
+
+
+def is_alive(connection):
+    """Проверка соединения из пула перед выдачей."""
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        connection.rollback()
+    except psycopg2.Error:
+        return False
+    return True
+
+
+def get_pool(alias, conn_params):
+    """Пул для алиаса в текущем процессе, после fork создается заново."""
+    key = (alias, os.getpid())
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(conn_params)
+        return _pools[key]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Бэкенд PostgreSQL, который берет соединения из пула процесса
+    и возвращает их туда при закрытии вместо разрыва соединения.
+    """
+
+    def get_new_connection(self, conn_params):
+        connection = get_pool(self.alias, conn_params).getconn()
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                get_pool(
+                    self.alias, self.get_connection_params()
+                ).putconn(self.connection)
@@ -0,0 +1,46 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+_read_database = ContextVar('read_database', default=None)
+
+
+def choose_replica():
+    """Случайная реплика из REPLICA_DATABASES или None, если их нет."""
+    replicas = settings.REPLICA_DATABASES
+    return random.choice(replicas) if replicas else None
+
+
+def set_read_database(alias):
+    """Направить чтения текущего запроса в alias (None - основная БД)."""
+    return _read_database.set(alias)
+
+
+def reset_read_database(token):
+    _read_database.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Роутер БД: записи и миграции идут в основную БД, чтения - в
+    реплику, выбранную middleware для текущего запроса. Вне запроса
+    (команды, фоновые задачи) все идет в основную БД. Токены и сессии
+    всегда читаются из основной БД: только что выданный токен может
+    еще не дойти до реплики.
+    """
+    primary_models = ('authtoken.token', 'sessions.session')
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower in self.primary_models:
+            return None
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
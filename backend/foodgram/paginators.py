@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор админки: для нефильтрованных списков на PostgreSQL берет
+    оценку числа строк из статистики pg_class вместо COUNT(*) по всей
+    таблице. Небольшие таблицы и отфильтрованные списки считаются точно.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = self.get_estimate()
+        if (
+            estimate is not None
+            and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD
+        ):
+            return estimate
+        return super().count
+
+    def get_estimate(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is None or query.where:
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = to_regclass(%s)',
+                [connection.ops.quote_name(queryset.model._meta.db_table)]
+            )
+            row = cursor.fetchone()
+        return row[0] if row and row[0] > 0 else None
@@ -1,12 +1,12 @@
 import os
 
 from pathlib import Path
-from dotenv import find_dotenv, load_dotenv
+from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 env_path = BASE_DIR.parent / '.env'
-load_dotenv(find_dotenv())
+load_dotenv(env_path)
 
 SECRET_KEY = os.getenv('MY_SECRET_KEY', default='None')
 
@@ -15,13 +15,17 @@ DEBUG = True
 ALLOWED_HOSTS = ['*']
 
 
+# ADMIN_ENABLED=False полностью отключает админку (приложение и URL /admin/),
+# например на воркерах, которые обслуживают только API.
+ADMIN_ENABLED = os.getenv('ADMIN_ENABLED', default='True') == 'True'
+
 INSTALLED_APPS = [
-    'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'djoser',
@@ -32,13 +36,18 @@ INSTALLED_APPS = [
     'recipes.apps.RecipesConfig',
     'django_filters',
 ]
+if ADMIN_ENABLED:
+    INSTALLED_APPS.insert(0, 'django.contrib.admin')
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.CompressionMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -71,7 +80,53 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+    }
+}
+# Проверять постоянные соединения в начале каждого запроса.
+DB_CONN_HEALTH_CHECKS = (
+    os.getenv('DB_CONN_HEALTH_CHECKS', default='True') == 'True'
+)
+# Пул соединений процесса (только PostgreSQL): соединение возвращается
+# в пул в конце запроса и используется повторно любым потоком.
+DB_POOL = os.getenv('DB_POOL', default='False') == 'True'
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', default=1))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', default=10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', default=10))
+if DB_POOL:
+    DATABASES['default'].update(ENGINE='foodgram.db_pool', CONN_MAX_AGE=0)
+
+# Реплики для чтения: хосты через запятую (для SQLite - пути к файлам).
+REPLICA_DATABASES = []
+for index, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(','))
+):
+    alias = f'replica_{index}'
+    key = 'NAME' if 'sqlite3' in DATABASES['default']['ENGINE'] else 'HOST'
+    DATABASES[alias] = dict(
+        DATABASES['default'], **{key: replica.strip()},
+        TEST={'MIRROR': 'default'}
+    )
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+REPLICA_VIEWS = (
+    'api.recipes.views.RecipeViewSet',
+    'api.recipes.views.TagViewSet',
+    'api.recipes.views.IngredientViewSet',
+    'api.users.views.UsersViewSet',
+)
+# Сколько секунд после записи чтения юзера идут в основную БД.
+DB_STICKY_SECONDS = int(os.getenv('DB_STICKY_SECONDS', default=5))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
     }
 }
 
@@ -111,11 +166,47 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.TokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'read': os.getenv('THROTTLE_RATE_READ', default='600/min'),
+        'write': os.getenv('THROTTLE_RATE_WRITE', default='120/min'),
+        'export': os.getenv('THROTTLE_RATE_EXPORT', default='10/min'),
+    },
+    # IP клиента берется из X-Forwarded-For, который дописывает nginx.
+    'NUM_PROXIES': int(os.getenv('THROTTLE_NUM_PROXIES', default=1)),
 }
 
+# local - корзины в памяти воркера, cache - в общем кеше воркеров.
+THROTTLE_BACKEND = os.getenv('THROTTLE_BACKEND', default='local')
+THROTTLE_LOCAL_MAX_KEYS = 100000
+
 AUTH_USER_MODEL = 'users.User'
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма из запросов только ставятся в очередь, отправляет их
+# воркер send_queued_email через EMAIL_QUEUE_BACKEND.
+EMAIL_BACKEND = 'users.mail.QueuedEmailBackend'
+EMAIL_QUEUE_BACKEND = os.getenv(
+    'EMAIL_QUEUE_BACKEND',
+    default='django.core.mail.backends.filebased.EmailBackend'
+)
+EMAIL_QUEUE_BATCH_SIZE = 50
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_RETRY_DELAY = 60
+EMAIL_QUEUE_POLL_INTERVAL = 2.0
+# Через сколько секунд письма, взятые упавшим воркером, отправляются снова.
+EMAIL_QUEUE_SEND_TIMEOUT = 300
 EMAIL_FILE_PATH = BASE_DIR / 'sent_emails'
+EMAIL_HOST = os.getenv('EMAIL_HOST', default='localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', default=25))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', default='False') == 'True'
+EMAIL_TIMEOUT = 10
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', default='test@test.com')
 DEFAULT_FIELD_SIZE = 50
 
@@ -127,9 +218,112 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = BASE_DIR / 'media'
 
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
+
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+RECIPE_IMAGE_MAX_DIMENSION = 6000
+RECIPE_IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+RECIPE_IMAGE_WIDTHS = (160, 320, 640, 1024)
+# Файл, сохраненный за это время (с), не удаляется при очистке: больше
+# времени между сохранением файла и фиксацией транзакции рецепта.
+RECIPE_IMAGE_DELETE_GRACE = int(
+    os.getenv('RECIPE_IMAGE_DELETE_GRACE', default=60)
+)
+
+FEED_FANOUT_MAX_FOLLOWERS = int(
+    os.getenv('FEED_FANOUT_MAX_FOLLOWERS', default=5000)
+)
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_BACKFILL_RECIPES = 50
+FEED_CELEBRITIES_CACHE_TIMEOUT = 600
+
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', default=300))
+# Подбор по ингредиентам: не больше PANTRY_MAX_CANDIDATES рецептов,
+# прошедших фильтры; фильтры проверяются пачками id.
+PANTRY_MAX_CANDIDATES = 1000
+PANTRY_FILTER_CHUNK = 1000
+
+SIMILAR_RECIPES_TOP_K = 10
+SIMILAR_RECIPES_TAG_WEIGHT = 0.5
+SIMILAR_RECIPES_BATCH_SIZE = 500
+# Как часто матрица признаков процесса строится заново целиком, с.
+SIMILAR_RECIPES_MATRIX_TTL = int(
+    os.getenv('SIMILAR_RECIPES_MATRIX_TTL', default=3600)
+)
+# Пересчет соседей при записи рецепта в фоне воркера. Каждый воркер
+# держит свою матрицу признаков всего каталога, поэтому по умолчанию
+# соседей пересчитывает команда compute_similar_recipes по расписанию.
+SIMILAR_RECIPES_ON_WRITE = (
+    os.getenv('SIMILAR_RECIPES_ON_WRITE', default='False') == 'True'
+)
+
+FACETS_COOKING_TIME_BUCKETS = (15, 30, 60)
+FACETS_CACHE_TIMEOUT = int(os.getenv('FACETS_CACHE_TIMEOUT', default=60))
+
+POPULARITY_FAVORITE_WEIGHT = 1.0
+POPULARITY_CART_WEIGHT = 0.5
+POPULARITY_HALF_LIFE_HOURS = float(
+    os.getenv('POPULARITY_HALF_LIFE_HOURS', default=72)
+)
+POPULARITY_MIN_SCORE = 0.01
+
+# Отложенная пакетная запись избранного и корзины.
+TOGGLE_WRITE_BEHIND = (
+    os.getenv('TOGGLE_WRITE_BEHIND', default='False') == 'True'
+)
+TOGGLE_FLUSH_INTERVAL_MS = int(
+    os.getenv('TOGGLE_FLUSH_INTERVAL_MS', default=200)
+)
+TOGGLE_FLUSH_MAX_ITEMS = int(
+    os.getenv('TOGGLE_FLUSH_MAX_ITEMS', default=500)
+)
+TOGGLE_PENDING_TIMEOUT = 60
+TOGGLE_PENDING_SLOTS = 100
+
+BULK_CREATE_MAX_ITEMS = 500
+BULK_CREATE_CHUNK_SIZE = 100
+BULK_IMAGE_WORKERS = int(os.getenv('BULK_IMAGE_WORKERS', default=4))
+
+# Фоновое удаление помеченных юзеров и рецептов.
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', default=500))
+PURGE_BATCH_PAUSE = float(os.getenv('PURGE_BATCH_PAUSE', default=0.05))
+# Потоки удаления отдельно от BACKGROUND_WORKERS.
+PURGE_WORKERS = int(os.getenv('PURGE_WORKERS', default=1))
+
+# С какой длины запроса поиск юзеров ищет и подстроку username
+# (только PostgreSQL, по триграммному индексу).
+USER_SEARCH_CONTAINS_MIN_LENGTH = 3
+
+# С какого размера таблицы админка показывает оценку числа строк.
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 10000
+
+# Сжатие ответов и кеш ответов на анонимные GET-запросы:
+# (регулярное выражение пути, время жизни в кеше в секундах).
+RESPONSE_CACHE_RULES = (
+    (r'^/api/tags/', 300),
+    (r'^/api/ingredients/', 300),
+    (r'^/api/recipes/$', 30),
+)
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_GZIP_LEVEL = 6
+COMPRESS_BROTLI_QUALITY = 4
+# Варианты из кеша сжимаются один раз, поэтому сильнее.
+COMPRESS_CACHED_GZIP_LEVEL = 9
+COMPRESS_CACHED_BROTLI_QUALITY = 9
+
+# Загрузить URLconf и индекс ингредиентов при запуске gunicorn
+# (хуки в gunicorn.conf.py, при --preload - один раз в мастере).
+WARM_UP_ON_START = os.getenv('WARM_UP_ON_START', default='True') == 'True'
+
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', default=2))
+BACKGROUND_TASKS_EAGER = os.getenv('BACKGROUND_TASKS_EAGER', default='False') == 'True'
+
 DJOSER = {
     'HIDE_USERS': False,
     'LOGIN_FIELD': 'email',
+    'PASSWORD_RESET_CONFIRM_URL': 'password/reset/confirm/{uid}/{token}',
     'SERIALIZERS': {
         'user_create': 'api.users.serializers.UserCreateSerializer',
         'user': 'api.users.serializers.UserSerializer',
@@ -140,3 +334,6 @@ DJOSER = {
         'user_list': ['rest_framework.permissions.AllowAny'],
     },
 }
+
+METRICS_DIR = os.getenv('METRICS_DIR', default=BASE_DIR / 'metrics')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', default=1))
@@ -1,9 +1,11 @@
-from django.contrib import admin
+from django.conf import settings
 from django.urls import include, path
 from django.views.generic import TemplateView
 
+from api.views import metrics
+
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    path('api/metrics', metrics, name='metrics'),
     path('api/', include('api.users.urls')),
     path('api/', include('api.recipes.urls')),
     path(
@@ -12,3 +14,8 @@ urlpatterns = [
         name='redoc'
     ),
 ]
+
+if settings.ADMIN_ENABLED:
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
@@ -0,0 +1,26 @@
+import logging
+
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    """
+    Подготовка процесса до первого запроса: загрузка URLconf (а с ним
+    всех представлений и сериализаторов) и индекса ингредиентов.
+    При gunicorn --preload выполняется один раз в мастере, воркеры
+    получают готовые объекты copy-on-write. Соединения с БД после
+    прогрева закрываются, чтобы не передать их воркерам.
+    """
+    from django.urls import get_resolver
+
+    from recipes.ingredient_index import ingredient_index
+
+    get_resolver().url_patterns
+    try:
+        ingredient_index.build()
+    except DatabaseError as error:
+        logger.warning('Индекс ингредиентов не загружен: %s', error)
+    finally:
+        connections.close_all()
@@ -0,0 +1,57 @@
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0:8000')
+workers = int(
+    os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1)
+)
+# Приложение загружается и прогревается в мастере один раз,
+# воркеры стартуют fork без повторного импорта.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+
+def on_starting(server):
+    """Метрики прошлого запуска сервера не суммируются с новыми."""
+    from api.metrics import registry
+    registry.clear()
+
+
+def warm_up():
+    from django.conf import settings
+
+    if settings.WARM_UP_ON_START:
+        from foodgram.warmup import warm_up
+
+        warm_up()
+
+
+def when_ready(server):
+    """
+    С --preload приложение уже загружено в мастере: оно прогревается
+    здесь один раз. Объекты, созданные при загрузке, исключаются из
+    сборки мусора: иначе проход GC в воркере меняет счетчики в общих
+    страницах памяти и они копируются в каждый воркер.
+    """
+    if preload_app:
+        warm_up()
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    """Без --preload каждый воркер прогревается после загрузки."""
+    if not preload_app:
+        warm_up()
+
+
+def worker_exit(server, worker):
+    from api.metrics import registry
+    registry.flush()
+
+
+def child_exit(server, worker):
+    """Значения завершенного воркера переносятся в общий файл метрик."""
+    from api.metrics import registry
+    registry.mark_process_dead(worker.pid)
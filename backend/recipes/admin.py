@@ -1,4 +1,8 @@
 from django.contrib import admin
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from foodgram.paginators import EstimatedCountPaginator
 
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                      ShoppingCart, Tag)
@@ -9,14 +13,17 @@ class TagsAdmin(admin.ModelAdmin):
     """Админка для тегов."""
     list_display = ('id', 'name', 'color', 'slug')
     list_filter = ('name',)
+    search_fields = ('name', 'slug')
 
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     """Админка для ингредиентов."""
     list_display = ('id', 'name', 'unit_of_measurement')
-    search_fields = ('name',)
-    list_filter = ('name', 'unit_of_measurement')
+    search_fields = ('^name',)
+    list_filter = ('unit_of_measurement',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def unit_of_measurement(self, obj):
         """Возвращает единицу измерения для ингредиента."""
@@ -27,6 +34,7 @@ class IngredientAdmin(admin.ModelAdmin):
 class RecipeIngredientAdmin(admin.TabularInline):
     model = RecipeIngredient
     min_num = 1
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Recipe)
@@ -39,24 +47,58 @@ class RecipeAdmin(admin.ModelAdmin):
         'text',
         'cooking_time',
         'pub_date',
+        'favorites',
     )
     inlines = (RecipeIngredientAdmin,)
-    search_fields = ('name',)
-    list_filter = ('author', 'name', 'tags',)
+    search_fields = ('^name',)
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    autocomplete_fields = ('author', 'tags')
     readonly_fields = ('favorites',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        """
+        Количество добавлений в избранное считается подзапросом только
+        для рецептов страницы, без GROUP BY по всей таблице.
+        """
+        favorites = (
+            Favorite.objects
+            .filter(recipe=OuterRef('pk'))
+            .order_by()
+            .values('recipe')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+        return super().get_queryset(request).annotate(
+            favorites_count=Coalesce(
+                Subquery(favorites, output_field=IntegerField()), 0
+            )
+        )
 
     def favorites(self, obj):
         """Возвращает количество юзеров, добавивших рецепт в избранное."""
-        return obj.favorite.count()
+        return obj.favorites_count
+    favorites.short_description = 'В избранном'
+    favorites.admin_order_field = 'favorites_count'
 
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     """Админка корзины."""
     list_display = ('id', 'user', 'recipe',)
+    list_select_related = ('user', 'recipe__author')
+    autocomplete_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     """Админка избранного."""
     list_display = ('id', 'user', 'recipe',)
+    list_select_related = ('user', 'recipe__author')
+    autocomplete_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,62 @@
+from django.db import connection, transaction
+
+from .cache import bump_recipes_version_on_commit
+from .feed import fan_out_recipe
+from .images import delete_unused_image, generate_variants
+from .ingredient_index import update_index_on_commit
+from .models import Recipe, RecipeIngredient
+from .similarity import schedule_update
+from .tasks import run_on_commit
+
+
+def create_recipes(recipes):
+    """
+    bulk_create рецептов с получением id. Если БД не возвращает id из
+    пакетной вставки (SQLite), рецепты сохраняются по одному.
+    """
+    bump_recipes_version_on_commit()
+    if connection.features.can_return_rows_from_bulk_insert:
+        return Recipe.objects.bulk_create(recipes), True
+    for recipe in recipes:
+        recipe.save()
+    return recipes, False
+
+
+def insert_recipes(entries):
+    """
+    Вставить пачку рецептов в одной транзакции. entries - список
+    (Recipe, [id тегов], [(id ингредиента, количество)]). После фиксации
+    ставятся те же фоновые задачи, что и при создании рецепта через API.
+    """
+    with transaction.atomic():
+        recipes, bulk = create_recipes([recipe for recipe, _, _ in entries])
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+            for recipe, (_, tag_ids, _) in zip(recipes, entries)
+            for tag_id in tag_ids
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe_id=recipe.id, ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for recipe, (_, _, ingredients) in zip(recipes, entries)
+            for ingredient_id, amount in ingredients
+        ])
+        for recipe, (_, _, ingredients) in zip(recipes, entries):
+            update_index_on_commit(
+                recipe.id,
+                [ingredient_id for ingredient_id, _ in ingredients]
+            )
+            schedule_update(recipe.id)
+            run_on_commit(fan_out_recipe, recipe.id)
+            if bulk and recipe.image:
+                run_on_commit(generate_variants, recipe.id)
+    return recipes
+
+
+def discard_images(names):
+    """Удалить сохраненные изображения рецептов, которые не записались."""
+    for name in names:
+        if name:
+            run_on_commit(delete_unused_image, name, [])
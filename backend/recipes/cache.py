@@ -0,0 +1,23 @@
+from django.core.cache import cache
+from django.db import transaction
+
+RECIPES_VERSION_CACHE_KEY = 'recipes:version'
+
+
+def get_recipes_version():
+    """Версия рецептов: входит в ключи кеша ответов со списками."""
+    return cache.get(RECIPES_VERSION_CACHE_KEY, 0)
+
+
+def bump_recipes_version():
+    """Отметить изменение рецептов: закешированные ответы устаревают."""
+    cache.add(RECIPES_VERSION_CACHE_KEY, 0, None)
+    try:
+        return cache.incr(RECIPES_VERSION_CACHE_KEY)
+    except ValueError:
+        return None
+
+
+def bump_recipes_version_on_commit():
+    """Сменить версию после фиксации, чтобы кеш не заполнился старыми."""
+    transaction.on_commit(bump_recipes_version)
@@ -0,0 +1,148 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F
+
+from users.models import Subscription
+
+from .models import FeedEntry, Recipe
+from .tasks import run_in_background
+
+CELEBRITIES_CACHE_KEY = 'feed:celebrities'
+# Последний вычисленный список без срока жизни: по нему видно, какие
+# авторы перестали быть популярными.
+PREVIOUS_CELEBRITIES_CACHE_KEY = 'feed:celebrities:previous'
+
+
+def get_celebrity_ids():
+    """
+    Авторы, у которых подписчиков больше FEED_FANOUT_MAX_FOLLOWERS.
+    Их рецепты не раскладываются по лентам, а читаются при запросе ленты.
+    Рецепты авторов, которые перестали быть популярными, раскладываются
+    по лентам подписчиков в фоне.
+    """
+    celebrity_ids = cache.get(CELEBRITIES_CACHE_KEY)
+    if celebrity_ids is None:
+        celebrity_ids = set(
+            Subscription.objects
+            .values('author')
+            .annotate(followers=Count('id'))
+            .filter(followers__gt=settings.FEED_FANOUT_MAX_FOLLOWERS)
+            .values_list('author', flat=True)
+        )
+        cache.set(
+            CELEBRITIES_CACHE_KEY, celebrity_ids,
+            settings.FEED_CELEBRITIES_CACHE_TIMEOUT
+        )
+        previous_ids = cache.get(PREVIOUS_CELEBRITIES_CACHE_KEY) or set()
+        cache.set(PREVIOUS_CELEBRITIES_CACHE_KEY, celebrity_ids, None)
+        for author_id in previous_ids - celebrity_ids:
+            run_in_background(fan_out_author, author_id)
+    return celebrity_ids
+
+
+def fan_out_recipe(recipe_id):
+    """Фоновая задача: добавить рецепт в ленты подписчиков автора."""
+    recipe = (
+        Recipe.objects.filter(pk=recipe_id)
+        .values('author_id', 'pub_date')
+        .first()
+    )
+    if recipe is None or recipe['author_id'] in get_celebrity_ids():
+        return
+    follower_ids = (
+        Subscription.objects
+        .filter(author_id=recipe['author_id'])
+        .values_list('user_id', flat=True)
+        .iterator()
+    )
+    batch = []
+    for follower_id in follower_ids:
+        batch.append(FeedEntry(
+            user_id=follower_id,
+            recipe_id=recipe_id,
+            author_id=recipe['author_id'],
+            pub_date=recipe['pub_date'],
+        ))
+        if len(batch) >= settings.FEED_FANOUT_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_author(author_id):
+    """
+    Фоновая задача: разложить последние рецепты автора по лентам всех
+    подписчиков. Нужна, когда автор перестал быть популярным: рецепты,
+    опубликованные до этого, в ленты не попадали.
+    """
+    recipes = list(
+        Recipe.objects.filter(author_id=author_id, deleted_at__isnull=True)
+        .order_by('-pub_date')
+        .values('id', 'pub_date')[:settings.FEED_BACKFILL_RECIPES]
+    )
+    if not recipes:
+        return
+    follower_ids = (
+        Subscription.objects
+        .filter(author_id=author_id)
+        .values_list('user_id', flat=True)
+        .iterator()
+    )
+    batch = []
+    for follower_id in follower_ids:
+        batch.extend(
+            FeedEntry(user_id=follower_id, recipe_id=recipe['id'],
+                      author_id=author_id, pub_date=recipe['pub_date'])
+            for recipe in recipes
+        )
+        if len(batch) >= settings.FEED_FANOUT_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def add_author_to_feed(user_id, author_id):
+    """Фоновая задача: после подписки добавить в ленту рецепты автора."""
+    if author_id in get_celebrity_ids():
+        return
+    recipes = (
+        Recipe.objects.filter(author_id=author_id)
+        .order_by('-pub_date')
+        .values('id', 'pub_date')[:settings.FEED_BACKFILL_RECIPES]
+    )
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe_id=recipe['id'],
+                      author_id=author_id, pub_date=recipe['pub_date'])
+            for recipe in recipes
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def remove_author_from_feed(user_id, author_id):
+    """Фоновая задача: после отписки убрать рецепты автора из ленты."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def feed_querysets(user, recipes):
+    """
+    Источники ленты юзера для FeedPaginator: записи его ленты, которые
+    листаются по индексу (user, pub_date), и рецепты популярных авторов
+    из его подписок, которые читаются при запросе. recipes - queryset
+    рецептов с фильтрами запроса.
+    """
+    celebrity_ids = get_celebrity_ids()
+    followed_celebrities = list(
+        Subscription.objects
+        .filter(user=user, author_id__in=celebrity_ids)
+        .values_list('author_id', flat=True)
+    ) if celebrity_ids else []
+    entries = FeedEntry.objects.filter(user=user, recipe__in=recipes)
+    if not followed_celebrities:
+        return [entries]
+    return [
+        entries.exclude(author_id__in=followed_celebrities),
+        recipes.filter(author_id__in=followed_celebrities)
+        .annotate(recipe_id=F('id')),
+    ]
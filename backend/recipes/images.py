@@ -0,0 +1,157 @@
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+VARIANT_FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+
+
+def probe_image(file):
+    """
+    Определяет формат и размеры изображения по заголовку файла.
+    Pillow при открытии читает только заголовок, пиксели не декодируются.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            image_format, (width, height) = image.format, image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise ValidationError('Загрузите корректное изображение.')
+    finally:
+        file.seek(0)
+    return image_format, width, height
+
+
+def validate_image(file):
+    """Проверка размера файла, формата и размеров изображения."""
+    if file.size > settings.RECIPE_IMAGE_MAX_SIZE:
+        raise ValidationError(
+            'Размер изображения не должен превышать '
+            f'{settings.RECIPE_IMAGE_MAX_SIZE // (1024 * 1024)} МБ.'
+        )
+    image_format, width, height = probe_image(file)
+    if image_format not in settings.RECIPE_IMAGE_FORMATS:
+        raise ValidationError(f'Формат {image_format} не поддерживается.')
+    max_dimension = settings.RECIPE_IMAGE_MAX_DIMENSION
+    if width > max_dimension or height > max_dimension:
+        raise ValidationError(
+            f'Изображение должно быть не больше {max_dimension} пикселей '
+            'по каждой стороне.'
+        )
+    return image_format, width, height
+
+
+def _resize(image, width):
+    from PIL import Image
+
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def build_variants(name):
+    """
+    Создает уменьшенные копии изображения в форматах JPEG и WebP
+    для каждой ширины из RECIPE_IMAGE_WIDTHS, не превышающей оригинал.
+    Возвращает словарь {формат: {ширина: имя файла в хранилище}}.
+    """
+    from PIL import Image
+
+    from .models import Recipe
+
+    stem = os.path.join(
+        Recipe._meta.get_field('image').upload_to,
+        os.path.splitext(os.path.basename(name))[0]
+    )
+    variants = {key: {} for key in VARIANT_FORMATS}
+    with default_storage.open(name, 'rb') as file, Image.open(file) as image:
+        widths = [
+            width for width in settings.RECIPE_IMAGE_WIDTHS
+            if width < image.width
+        ]
+        if not widths:
+            return variants
+        image.draft('RGB', (
+            max(widths),
+            -(-image.height * max(widths) // image.width)
+        ))
+        has_alpha = image.mode in ('RGBA', 'LA', 'P')
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        for width in widths:
+            resized = _resize(image, width)
+            for key, (image_format, extension, options) in (
+                VARIANT_FORMATS.items()
+            ):
+                picture = resized
+                if image_format == 'JPEG' and picture.mode != 'RGB':
+                    picture = picture.convert('RGB')
+                buffer = io.BytesIO()
+                picture.save(buffer, image_format, **options)
+                variants[key][str(width)] = default_storage.save(
+                    f'{stem}_w{width}.{extension}',
+                    ContentFile(buffer.getvalue())
+                )
+    return variants
+
+
+def generate_variants(recipe_id):
+    """Фоновая задача: подготовить варианты изображения рецепта."""
+    from .models import Recipe
+
+    name = (
+        Recipe.objects.filter(pk=recipe_id)
+        .values_list('image', flat=True)
+        .first()
+    )
+    if not name:
+        return
+    variants = build_variants(name)
+    Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_variants=variants
+    )
+
+
+def variants_srcset(variants, build_url):
+    """Словарь {формат: строка srcset} из сохраненных вариантов."""
+    return {
+        key: ', '.join(
+            f'{build_url(default_storage.url(name))} {width}w'
+            for width, name in sorted(
+                sizes.items(), key=lambda item: int(item[0])
+            )
+        )
+        for key, sizes in (variants or {}).items()
+    }
+
+
+def delete_unused_image(name, variants):
+    """
+    Фоновая задача: удалить файл изображения и его варианты,
+    если на изображение больше не ссылается ни один рецепт.
+    Файлы, сохраненные повторно за последние RECIPE_IMAGE_DELETE_GRACE
+    секунд, не удаляются: транзакция рецепта, который их использует,
+    может быть еще не зафиксирована.
+    """
+    from .models import Recipe
+
+    if not name or Recipe.objects.filter(image=name).exists():
+        return
+    for file_name in [name, *variants]:
+        default_storage.delete_unused(
+            file_name, settings.RECIPE_IMAGE_DELETE_GRACE
+        )
+
+
+def variant_names(variants):
+    """Имена файлов всех вариантов изображения."""
+    return [
+        name for sizes in (variants or {}).values()
+        for name in sizes.values()
+    ]
@@ -0,0 +1,181 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .tasks import run_in_background
+
+VERSION_CACHE_KEY = 'ingredient_index:version'
+
+
+def _get_version():
+    return cache.get(VERSION_CACHE_KEY, 0)
+
+
+def _bump_version():
+    """Отметить изменение ингредиентов рецептов для других воркеров."""
+    cache.add(VERSION_CACHE_KEY, 0, None)
+    try:
+        return cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        return None
+
+
+class IngredientIndex:
+    """
+    Инвертированный индекс в памяти процесса: id ингредиента ->
+    отсортированный массив id рецептов, в которых он используется.
+
+    Строится из RecipeIngredient при первом обращении и обновляется
+    точечно при записи рецептов в этом процессе. Записи других воркеров
+    видны по версии в общем кеше: если она изменилась или прошло
+    INGREDIENT_INDEX_TTL секунд, индекс перестраивается в фоне, а до
+    конца перестройки запросы читают прежний. Индекс, построенный в
+    мастере gunicorn при --preload, воркеры получают готовым.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._postings = {}
+        self._recipes = {}
+        self._built_at = None
+        self._version = None
+        self._rebuilding = False
+
+    def _is_stale(self):
+        return (
+            time.monotonic() - self._built_at
+            >= settings.INGREDIENT_INDEX_TTL
+            or _get_version() != self._version
+        )
+
+    def build(self):
+        """Полностью перестроить индекс."""
+        with self._build_lock:
+            self._build()
+
+    def _build(self):
+        from .models import RecipeIngredient
+
+        # Версия читается до данных: запись, сделанная во время
+        # перестройки, изменит ее, и индекс перестроится еще раз.
+        version = _get_version()
+        postings, recipes = {}, {}
+        rows = (
+            RecipeIngredient.objects
+            .order_by('ingredient_id', 'recipe_id')
+            .values_list('ingredient_id', 'recipe_id')
+            .iterator(chunk_size=10000)
+        )
+        for ingredient_id, recipe_id in rows:
+            recipe_ids = postings.get(ingredient_id)
+            if recipe_ids is None:
+                recipe_ids = postings[ingredient_id] = array('q')
+            if not recipe_ids or recipe_ids[-1] != recipe_id:
+                recipe_ids.append(recipe_id)
+            recipes.setdefault(recipe_id, array('q')).append(ingredient_id)
+        with self._lock:
+            self._postings, self._recipes = postings, recipes
+            self._built_at = time.monotonic()
+            self._version = version
+
+    def _rebuild(self):
+        try:
+            self.build()
+        finally:
+            self._rebuilding = False
+
+    def ensure_fresh(self):
+        """
+        Первое построение идет в запросе (остальные потоки ждут его),
+        устаревший индекс перестраивается одной фоновой задачей.
+        """
+        if self._built_at is None:
+            with self._build_lock:
+                if self._built_at is None:
+                    self._build()
+            return
+        if not self._is_stale():
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        run_in_background(self._rebuild)
+
+    def _applied(self, version):
+        """Своя запись уже в индексе: не перестраивать его из-за нее."""
+        if version is not None and self._version == version - 1:
+            self._version = version
+
+    def _remove(self, recipe_id):
+        for ingredient_id in self._recipes.pop(recipe_id, ()):
+            recipe_ids = self._postings.get(ingredient_id)
+            if recipe_ids is None:
+                continue
+            position = bisect_left(recipe_ids, recipe_id)
+            if (
+                position < len(recipe_ids)
+                and recipe_ids[position] == recipe_id
+            ):
+                del recipe_ids[position]
+
+    def update_recipe(self, recipe_id, ingredient_ids):
+        """Обновить ингредиенты рецепта, если индекс уже построен."""
+        version = _bump_version()
+        if self._built_at is None:
+            return
+        ingredient_ids = sorted(set(ingredient_ids))
+        with self._lock:
+            self._applied(version)
+            self._remove(recipe_id)
+            for ingredient_id in ingredient_ids:
+                insort(
+                    self._postings.setdefault(ingredient_id, array('q')),
+                    recipe_id
+                )
+            self._recipes[recipe_id] = array('q', ingredient_ids)
+
+    def remove_recipe(self, recipe_id):
+        """Убрать рецепт из индекса."""
+        version = _bump_version()
+        if self._built_at is None:
+            return
+        with self._lock:
+            self._applied(version)
+            self._remove(recipe_id)
+
+    def search(self, ingredient_ids):
+        """
+        Рецепты, в которых есть хотя бы один из ингредиентов.
+        Возвращает список (id рецепта, покрытие, недостающих
+        ингредиентов), отсортированный по убыванию покрытия
+        и возрастанию числа недостающих ингредиентов.
+        """
+        self.ensure_fresh()
+        with self._lock:
+            matched = Counter()
+            for ingredient_id in set(ingredient_ids):
+                matched.update(self._postings.get(ingredient_id, ()))
+            ranked = []
+            for recipe_id, count in matched.items():
+                total = len(self._recipes.get(recipe_id, ())) or count
+                ranked.append((recipe_id, count / total, total - count))
+        ranked.sort(key=lambda item: (-item[1], item[2], -item[0]))
+        return ranked
+
+
+ingredient_index = IngredientIndex()
+
+
+def update_index_on_commit(recipe_id, ingredient_ids):
+    """Обновить индекс после фиксации транзакции."""
+    transaction.on_commit(
+        lambda: ingredient_index.update_recipe(recipe_id, ingredient_ids)
+    )
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from recipes.similarity import compute_all, update_recipes
+
+
+class Command(BaseCommand):
+    """Команда для расчета похожих рецептов (нужны numpy и scipy)."""
+    help = 'Compute top-K similar recipes from ingredient and tag vectors'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=str, default='',
+            help='id рецептов через запятую для инкрементального пересчета'
+        )
+        parser.add_argument('--top-k', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            import numpy  # noqa: F401
+            import scipy  # noqa: F401
+        except ImportError:
+            raise CommandError('Для расчета нужны пакеты numpy и scipy.')
+        started = time.perf_counter()
+        if options['recipes']:
+            recipe_ids = {
+                int(value) for value in options['recipes'].split(',')
+            }
+            update_recipes(recipe_ids, top_k=options['top_k'])
+            count = len(recipe_ids)
+        else:
+            count = compute_all(
+                top_k=options['top_k'], batch_size=options['batch_size']
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {count} '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
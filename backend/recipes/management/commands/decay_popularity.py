@@ -0,0 +1,30 @@
+from django.core.management import BaseCommand
+
+from recipes.popularity import decay_all, rebuild_all
+
+
+class Command(BaseCommand):
+    """
+    Команда для затухания популярности рецептов. Запускается
+    по расписанию (cron) с интервалом, равным --hours.
+    """
+    help = 'Apply exponential time decay to recipe popularity'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=float, default=1.0,
+            help='сколько часов прошло с прошлого запуска'
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='пересчитать популярность по избранному и корзинам'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = rebuild_all()
+        else:
+            count = decay_all(options['hours'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Обновлено рецептов: {count}')
+        )
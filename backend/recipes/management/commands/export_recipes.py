@@ -0,0 +1,48 @@
+import sys
+
+from django.core.management import BaseCommand
+
+from recipes.transfer import Throughput, export_lines
+
+
+class Command(BaseCommand):
+    """Команда для выгрузки рецептов в NDJSON, по рецепту на строку."""
+    help = 'Stream recipes with tags, ingredients and images to NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='файл для выгрузки, "-" - стандартный вывод'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--after-id', type=int, default=0,
+            help='выгрузить рецепты с id больше указанного'
+        )
+        parser.add_argument(
+            '--with-images', action='store_true',
+            help='встроить изображения в Base64'
+        )
+
+    def handle(self, *args, **options):
+        throughput = Throughput()
+        batch_size = options['batch_size']
+        if options['path'] == '-':
+            output = sys.stdout.buffer
+        else:
+            output = open(options['path'], 'wb')
+        try:
+            for line in export_lines(
+                after_id=options['after_id'],
+                batch_size=batch_size,
+                with_images=options['with_images'],
+            ):
+                output.write(line)
+                throughput.add(1)
+                if throughput.count % batch_size == 0:
+                    self.stderr.write(f'Выгружено: {throughput.report()}')
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        self.stderr.write(
+            self.style.SUCCESS(f'Выгружено: {throughput.report()}')
+        )
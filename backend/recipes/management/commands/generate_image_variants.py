@@ -0,0 +1,27 @@
+from django.core.management import BaseCommand
+
+from recipes.images import generate_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Команда для подготовки уменьшенных копий изображений рецептов."""
+    help = 'Generate resized JPEG/WebP variants of recipe images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать варианты для всех рецептов'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(image=None)
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        count = 0
+        for recipe_id in recipes.values_list('id', flat=True).iterator():
+            generate_variants(recipe_id)
+            count += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано изображений: {count}')
+        )
@@ -0,0 +1,67 @@
+from django.core.management import BaseCommand, CommandError
+
+from recipes.transfer import (Checkpoint, RecipeImporter, Throughput,
+                              loads_line)
+
+
+class Command(BaseCommand):
+    """
+    Команда для загрузки рецептов из NDJSON пачками. После каждой
+    пачки позиция в файле сохраняется в checkpoint, повторный запуск
+    продолжает с нее.
+    """
+    help = 'Import recipes from NDJSON in batches with checkpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--checkpoint', default=None,
+            help='файл с позицией импорта (по умолчанию <path>.checkpoint)'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='начать сначала, игнорируя сохраненную позицию'
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = Checkpoint(
+            options['checkpoint'] or f'{options["path"]}.checkpoint'
+        )
+        if not options['restart']:
+            checkpoint.load()
+        importer = RecipeImporter(stdout=self.stdout)
+        throughput = Throughput(checkpoint.imported)
+        if checkpoint.offset:
+            self.stdout.write(
+                f'Продолжение с позиции {checkpoint.offset}, '
+                f'уже загружено {checkpoint.imported}'
+            )
+        with open(options['path'], 'rb') as file:
+            file.seek(checkpoint.offset)
+            while True:
+                items = []
+                while len(items) < options['batch_size']:
+                    line = file.readline()
+                    if not line:
+                        break
+                    if not line.strip():
+                        continue
+                    try:
+                        items.append(loads_line(line))
+                    except ValueError as error:
+                        raise CommandError(
+                            f'Некорректная строка на позиции '
+                            f'{file.tell() - len(line)}: {error}'
+                        )
+                if not items:
+                    break
+                throughput.add(importer.import_batch(items))
+                checkpoint.save(file.tell(), throughput.count)
+                self.stdout.write(f'Загружено: {throughput.report()}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено: {throughput.report()}, '
+            f'пропущено: {importer.skipped}. Для новых рецептов запустите '
+            f'generate_image_variants, rebuild_feeds '
+            f'и compute_similar_recipes.'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+
+from recipes.purge import purge_deleted
+
+
+class Command(BaseCommand):
+    """
+    Команда для удаления помеченных удаленными юзеров и рецептов,
+    которые не успели удалить фоновые задачи. Запускается по расписанию.
+    """
+    help = 'Purge soft-deleted users and recipes in small batches'
+
+    def handle(self, *args, **options):
+        users, recipes = purge_deleted()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено юзеров: {users}, рецептов: {recipes}'
+        ))
@@ -0,0 +1,23 @@
+from django.core.management import BaseCommand
+
+from recipes.feed import add_author_to_feed
+from users.models import Subscription
+
+
+class Command(BaseCommand):
+    """Команда для заполнения лент подписок по существующим подпискам."""
+    help = 'Fill subscription feeds from existing subscriptions'
+
+    def handle(self, *args, **kwargs):
+        subscriptions = (
+            Subscription.objects
+            .values_list('user_id', 'author_id')
+            .iterator()
+        )
+        count = 0
+        for user_id, author_id in subscriptions:
+            add_author_to_feed(user_id, author_id)
+            count += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано подписок: {count}')
+        )
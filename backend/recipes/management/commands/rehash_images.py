@@ -0,0 +1,32 @@
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Команда для переноса ранее загруженных изображений рецептов
+    в хранилище с адресацией по содержимому.
+    """
+    help = 'Move recipe images to content-addressed paths'
+
+    def handle(self, *args, **kwargs):
+        count = 0
+        recipes = (
+            Recipe.objects
+            .exclude(image='').exclude(image=None)
+            .exclude(image__startswith='recipes/')
+        )
+        for recipe in recipes.iterator():
+            if not default_storage.exists(recipe.image.name):
+                continue
+            with default_storage.open(recipe.image.name, 'rb') as file:
+                recipe.image.save(
+                    f'recipes/{recipe.image.name.rsplit("/", 1)[-1]}',
+                    file
+                )
+            count += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Перенесено изображений: {count}')
+        )
@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models.functions import Upper
 
 User = get_user_model()
 
@@ -54,6 +55,9 @@ class Ingredient(models.Model):
         ordering = ('name',)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        indexes = [
+            models.Index(Upper('name'), name='ingredient_name_upper_idx'),
+        ]
 
     def __str__(self):
         return str(self.name)
@@ -73,10 +77,16 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         verbose_name='Изображение рецепта',
-        upload_to='static/',
+        upload_to='recipes/',
         blank=True,
         null=True
     )
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии изображения',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     text = models.TextField(
         verbose_name='Описание рецепта',
         blank=True
@@ -103,11 +113,37 @@ class Recipe(models.Model):
         verbose_name='Тег рецепта',
         related_name='recipes'
     )
+    popularity = models.FloatField(
+        verbose_name='Популярность',
+        default=0.0,
+        editable=False
+    )
+    deleted_at = models.DateTimeField(
+        verbose_name='Удален',
+        null=True,
+        blank=True,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Список рецептов'
         ordering = ('-pub_date', )
+        indexes = [
+            models.Index(
+                fields=['-popularity', '-pub_date'],
+                name='recipe_popularity_idx',
+            ),
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx',
+            ),
+            models.Index(Upper('name'), name='recipe_name_upper_idx'),
+        ]
 
     def __str__(self):
         return f'{self.name} автор {self.author}'
@@ -196,3 +232,97 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'Рецепт {self.user} в избранном {self.recipe}'
+
+
+class FeedEntry(models.Model):
+    """
+    Модель ленты подписок: рецепт автора, на которого подписан юзер.
+    Заполняется при публикации рецепта (fan-out on write).
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='Подписчик',
+        on_delete=models.CASCADE,
+        related_name='feed'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор',
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        ordering = ('-pub_date', '-recipe')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_user_recipe',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+
+class SimilarRecipe(models.Model):
+    """
+    Модель похожих рецептов: заранее вычисленные ближайшие соседи
+    рецепта по косинусной близости ингредиентов и тегов.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='similar_entries'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        verbose_name='Похожий рецепт',
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField(
+        verbose_name='Близость'
+    )
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('recipe', '-score')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_recipe_similar',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe}'
@@ -0,0 +1,95 @@
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (Count, ExpressionWrapper, F, FloatField,
+                              OuterRef, Subquery, Value)
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Favorite, Recipe, ShoppingCart
+
+
+def get_weight(model):
+    """Вклад добавления в избранное или корзину в популярность."""
+    if model is Favorite:
+        return settings.POPULARITY_FAVORITE_WEIGHT
+    if model is ShoppingCart:
+        return settings.POPULARITY_CART_WEIGHT
+    return 0.0
+
+
+def change_popularity(recipe_id, model, sign=1):
+    """
+    Атомарно изменить популярность рецепта одним UPDATE. При удалении
+    вклад вычитается без учета затухания, поэтому значение
+    ограничивается снизу нулем.
+    """
+    weight = get_weight(model) * sign
+    if not weight:
+        return
+    Recipe.objects.filter(id=recipe_id).update(
+        popularity=Greatest(F('popularity') + weight, Value(0.0))
+    )
+
+
+def change_popularity_bulk(deltas):
+    """
+    Применить изменения популярности {recipe_id: delta}: один UPDATE
+    на каждое различное значение delta.
+    """
+    recipes_by_delta = {}
+    for recipe_id, delta in deltas.items():
+        if delta:
+            recipes_by_delta.setdefault(delta, []).append(recipe_id)
+    for delta, recipe_ids in recipes_by_delta.items():
+        Recipe.objects.filter(id__in=recipe_ids).update(
+            popularity=Greatest(F('popularity') + delta, Value(0.0))
+        )
+
+
+def decay_factor(hours):
+    """Множитель затухания за hours часов при периоде полураспада."""
+    return math.exp(
+        -math.log(2) * hours / settings.POPULARITY_HALF_LIFE_HOURS
+    )
+
+
+def decay_all(hours):
+    """
+    Применить затухание ко всем рецептам. Слишком малые значения
+    обнуляются, чтобы не обновлять их при каждом запуске.
+    """
+    factor = decay_factor(hours)
+    with transaction.atomic():
+        updated = Recipe.objects.filter(
+            popularity__gte=settings.POPULARITY_MIN_SCORE
+        ).update(popularity=F('popularity') * factor)
+        Recipe.objects.filter(
+            popularity__gt=0,
+            popularity__lt=settings.POPULARITY_MIN_SCORE
+        ).update(popularity=0.0)
+    return updated
+
+
+def _weighted_count(model):
+    counts = (
+        model.objects
+        .filter(recipe=OuterRef('id'))
+        .values('recipe')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    return ExpressionWrapper(
+        Coalesce(Subquery(counts), 0) * get_weight(model),
+        output_field=FloatField()
+    )
+
+
+def rebuild_all():
+    """
+    Пересчитать популярность по текущим спискам одним UPDATE без учета
+    затухания, например после первого развертывания.
+    """
+    return Recipe.objects.update(
+        popularity=_weighted_count(Favorite) + _weighted_count(ShoppingCart)
+    )
@@ -0,0 +1,166 @@
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import Subscription
+
+from .cache import bump_recipes_version_on_commit
+from .models import (Favorite, FeedEntry, Recipe, RecipeIngredient,
+                     ShoppingCart, SimilarRecipe)
+from .popularity import change_popularity_bulk, get_weight
+from .tasks import run_on_commit
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+def soft_delete_recipe(recipe):
+    """
+    Рецепт сразу скрывается из выдачи, а строки, которые удаляются
+    вместе с ним, удаляются в фоне небольшими пачками.
+    """
+    Recipe.objects.filter(pk=recipe.pk).update(deleted_at=timezone.now())
+    bump_recipes_version_on_commit()
+    run_on_commit(purge_recipe, recipe.pk, pool='purge')
+
+
+@transaction.atomic
+def soft_delete_user(user):
+    """
+    Юзер и его рецепты скрываются одним UPDATE каждый, вход
+    блокируется через is_active, данные удаляются в фоне.
+    """
+    now = timezone.now()
+    User.objects.filter(pk=user.pk).update(deleted_at=now, is_active=False)
+    Recipe.objects.filter(
+        author_id=user.pk, deleted_at__isnull=True
+    ).update(deleted_at=now)
+    bump_recipes_version_on_commit()
+    run_on_commit(purge_user, user.pk, pool='purge')
+
+
+def delete_in_batches(queryset, on_batch=None):
+    """
+    Удалять строки queryset пачками по PURGE_BATCH_SIZE по возрастанию
+    id, каждую пачку - в своей короткой транзакции. on_batch получает
+    удаляемые строки до удаления. Возвращает число удаленных строк.
+    """
+    model = queryset.model
+    batch_size = settings.PURGE_BATCH_SIZE
+    fields = ('id', 'recipe_id') if on_batch else ('id',)
+    deleted, last_id = 0, 0
+    while True:
+        rows = list(
+            queryset.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list(*fields)[:batch_size]
+        )
+        if not rows:
+            return deleted
+        ids = [row[0] for row in rows]
+        with transaction.atomic():
+            if on_batch:
+                on_batch(model, rows)
+            model.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+        last_id = ids[-1]
+        if settings.PURGE_BATCH_PAUSE:
+            time.sleep(settings.PURGE_BATCH_PAUSE)
+
+
+def _decrease_popularity(model, rows):
+    """Убрать из популярности рецептов вклад удаляемых строк."""
+    weight = get_weight(model)
+    counts = Counter(recipe_id for _, recipe_id in rows)
+    change_popularity_bulk({
+        recipe_id: -weight * count for recipe_id, count in counts.items()
+    })
+
+
+def purge_recipe(recipe_id):
+    """
+    Фоновая задача: удалить помеченный рецепт. Зависимые строки
+    удаляются пачками, сам рецепт - последним, его изображение
+    убирается в фоне сигналом post_delete.
+    """
+    if not Recipe.objects.filter(
+        pk=recipe_id, deleted_at__isnull=False
+    ).exists():
+        return
+    for queryset in (
+        FeedEntry.objects.filter(recipe_id=recipe_id),
+        Favorite.objects.filter(recipe_id=recipe_id),
+        ShoppingCart.objects.filter(recipe_id=recipe_id),
+        SimilarRecipe.objects.filter(recipe_id=recipe_id),
+        SimilarRecipe.objects.filter(similar_id=recipe_id),
+        RecipeIngredient.objects.filter(recipe_id=recipe_id),
+        Recipe.ingredients.through.objects.filter(recipe_id=recipe_id),
+        Recipe.tags.through.objects.filter(recipe_id=recipe_id),
+    ):
+        delete_in_batches(queryset)
+    with transaction.atomic():
+        for recipe in Recipe.objects.filter(pk=recipe_id):
+            recipe.delete()
+
+
+def purge_user(user_id):
+    """
+    Фоновая задача: удалить помеченного юзера. Сначала удаляются
+    его рецепты, затем подписки, лента, избранное и корзина.
+    """
+    if not User.objects.filter(
+        pk=user_id, deleted_at__isnull=False
+    ).exists():
+        return
+    recipe_ids = (
+        Recipe.objects.filter(author_id=user_id)
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+    for recipe_id in list(recipe_ids):
+        purge_recipe(recipe_id)
+    delete_in_batches(
+        Favorite.objects.filter(user_id=user_id), _decrease_popularity
+    )
+    delete_in_batches(
+        ShoppingCart.objects.filter(user_id=user_id), _decrease_popularity
+    )
+    for queryset in (
+        FeedEntry.objects.filter(user_id=user_id),
+        FeedEntry.objects.filter(author_id=user_id),
+        Subscription.objects.filter(user_id=user_id),
+        Subscription.objects.filter(author_id=user_id),
+    ):
+        delete_in_batches(queryset)
+    with transaction.atomic():
+        for user in User.objects.filter(pk=user_id):
+            user.delete()
+
+
+def purge_deleted():
+    """
+    Удалить всех помеченных юзеров и рецепты, например после
+    перезапуска воркера, который не успел выполнить фоновые задачи.
+    Возвращает число (юзеров, рецептов).
+    """
+    user_ids = list(
+        User.objects.filter(deleted_at__isnull=False)
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+    for user_id in user_ids:
+        purge_user(user_id)
+    recipe_ids = list(
+        Recipe.objects.filter(deleted_at__isnull=False)
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+    for recipe_id in recipe_ids:
+        purge_recipe(recipe_id)
+    return len(user_ids), len(recipe_ids)
@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_recipes_version_on_commit
+from .images import delete_unused_image, generate_variants, variant_names
+from .ingredient_index import ingredient_index
+from .models import Recipe
+from .tasks import run_on_commit
+
+
+@receiver(pre_save, sender=Recipe)
+def reset_image_variants(sender, instance, **kwargs):
+    """При замене изображения старые варианты больше не подходят."""
+    instance._replaced_image = None
+    if instance.pk is None:
+        return
+    old = (
+        Recipe.objects.filter(pk=instance.pk)
+        .values('image', 'image_variants')
+        .first()
+    )
+    if old and (old['image'] or '') != (instance.image.name or ''):
+        instance.image_variants = {}
+        instance._replaced_image = old
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_image_variants(sender, instance, **kwargs):
+    """
+    Варианты изображения готовятся в фоне после сохранения рецепта,
+    замененное изображение удаляется, если больше не используется.
+    """
+    if instance.image and not instance.image_variants:
+        run_on_commit(generate_variants, instance.pk)
+    old = getattr(instance, '_replaced_image', None)
+    if old:
+        run_on_commit(
+            delete_unused_image,
+            old['image'],
+            variant_names(old['image_variants'])
+        )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_cached_responses(sender, **kwargs):
+    """Закешированные ответы со списками рецептов устаревают."""
+    bump_recipes_version_on_commit()
+
+
+@receiver(post_delete, sender=Recipe)
+def schedule_image_cleanup(sender, instance, **kwargs):
+    """
+    Файлы удаленного рецепта убираются в фоне, рецепт удаляется
+    из индекса ингредиентов.
+    """
+    recipe_id = instance.pk
+    transaction.on_commit(lambda: ingredient_index.remove_recipe(recipe_id))
+    if instance.image:
+        run_on_commit(
+            delete_unused_image,
+            instance.image.name,
+            variant_names(instance.image_variants)
+        )
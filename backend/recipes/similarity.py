@@ -0,0 +1,325 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Recipe, RecipeIngredient, SimilarRecipe
+
+logger = logging.getLogger(__name__)
+
+_pending = set()
+_pending_lock = threading.Lock()
+_store_lock = threading.Lock()
+
+
+def build_matrix():
+    """
+    Разреженная матрица признаков рецептов: столбцы - ингредиенты
+    и теги (с весом SIMILAR_RECIPES_TAG_WEIGHT), строки нормированы,
+    поэтому произведение строк равно косинусной близости.
+    Возвращает матрицу, массив id рецептов по строкам и словарь
+    столбцов {('ingredient' или 'tag', id): номер столбца}.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    recipe_ids = np.fromiter(
+        Recipe.objects.order_by('id').values_list('id', flat=True)
+        .iterator(), dtype=np.int64
+    )
+    ingredient_pairs = np.array(
+        list(RecipeIngredient.objects.values_list('recipe_id',
+                                                  'ingredient_id')),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    tag_pairs = np.array(
+        list(Recipe.tags.through.objects.values_list('recipe_id',
+                                                     'tag_id')),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    ingredient_ids, ingredient_columns = np.unique(
+        ingredient_pairs[:, 1], return_inverse=True
+    )
+    tag_ids, tag_columns = np.unique(tag_pairs[:, 1], return_inverse=True)
+    ingredient_count = len(ingredient_ids)
+    rows = np.searchsorted(
+        recipe_ids, np.concatenate([ingredient_pairs[:, 0], tag_pairs[:, 0]])
+    )
+    columns = np.concatenate(
+        [ingredient_columns, tag_columns + ingredient_count]
+    )
+    weights = np.concatenate([
+        np.ones(len(ingredient_columns)),
+        np.full(len(tag_columns), settings.SIMILAR_RECIPES_TAG_WEIGHT),
+    ])
+    matrix = sparse.csr_matrix(
+        (weights, (rows, columns)),
+        shape=(len(recipe_ids), ingredient_count + len(tag_ids))
+    )
+    column_map = {
+        ('ingredient', int(ingredient_id)): index
+        for index, ingredient_id in enumerate(ingredient_ids)
+    }
+    column_map.update(
+        (('tag', int(tag_id)), ingredient_count + index)
+        for index, tag_id in enumerate(tag_ids)
+    )
+    return _normalize(matrix), recipe_ids, column_map
+
+
+def _normalize(matrix):
+    import numpy as np
+    from scipy import sparse
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)))
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(matrix.multiply(1 / norms))
+
+
+class FeatureMatrix:
+    """
+    Матрица признаков в памяти процесса для инкрементального пересчета.
+    Строится целиком при первом обращении и раз в
+    SIMILAR_RECIPES_MATRIX_TTL секунд; между перестройками из БД читаются
+    только строки измененных и новых рецептов, а в матрице заменяются их
+    строки. Изменения рецептов другими процессами видны после перестройки.
+    Строки удаленных и замененных рецептов обнуляются, новые
+    добавляются в конец.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.matrix = None
+        self.recipe_ids = None
+        self.rows = {}
+        self.columns = {}
+        self.built_at = None
+
+    def load(self):
+        if (
+            self.matrix is None
+            or time.monotonic() - self.built_at
+            >= settings.SIMILAR_RECIPES_MATRIX_TTL
+        ):
+            self.matrix, self.recipe_ids, self.columns = build_matrix()
+            self.rows = {
+                int(recipe_id): row
+                for row, recipe_id in enumerate(self.recipe_ids)
+            }
+            self.built_at = time.monotonic()
+            return
+        # Рецепты, созданные другими процессами после построения.
+        new_ids = set(
+            Recipe.objects.filter(id__gt=max(self.rows, default=0))
+            .values_list('id', flat=True)
+        )
+        if new_ids:
+            self.replace(new_ids)
+
+    def _vectors(self, recipe_ids):
+        """Нормированные строки признаков для рецептов recipe_ids."""
+        import numpy as np
+        from scipy import sparse
+
+        pairs = [
+            (recipe_id, ('ingredient', ingredient_id), 1.0)
+            for recipe_id, ingredient_id in
+            RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+            .values_list('recipe_id', 'ingredient_id')
+        ]
+        pairs.extend(
+            (recipe_id, ('tag', tag_id),
+             settings.SIMILAR_RECIPES_TAG_WEIGHT)
+            for recipe_id, tag_id in
+            Recipe.tags.through.objects.filter(recipe_id__in=recipe_ids)
+            .values_list('recipe_id', 'tag_id')
+        )
+        positions = {
+            recipe_id: index for index, recipe_id in enumerate(recipe_ids)
+        }
+        for _, column, _ in pairs:
+            self.columns.setdefault(column, len(self.columns))
+        return _normalize(sparse.csr_matrix(
+            (
+                np.array([weight for _, _, weight in pairs]),
+                (
+                    np.array([positions[item[0]] for item in pairs],
+                             dtype=np.int64),
+                    np.array([self.columns[item[1]] for item in pairs],
+                             dtype=np.int64),
+                ),
+            ),
+            shape=(len(recipe_ids), len(self.columns)),
+        ))
+
+    def replace(self, recipe_ids):
+        """
+        Заменить строки рецептов актуальными данными из БД. Возвращает
+        номера строк существующих рецептов из recipe_ids.
+        """
+        import numpy as np
+        from scipy import sparse
+
+        existing = sorted(
+            Recipe.objects.filter(id__in=recipe_ids)
+            .values_list('id', flat=True)
+        )
+        vectors = self._vectors(existing)
+        matrix = self.matrix
+        for recipe_id in recipe_ids:
+            row = self.rows.pop(recipe_id, None)
+            if row is not None:
+                start, end = matrix.indptr[row], matrix.indptr[row + 1]
+                matrix.data[start:end] = 0
+                self.recipe_ids[row] = -1
+        matrix.eliminate_zeros()
+        matrix.resize((matrix.shape[0], len(self.columns)))
+        first_row = matrix.shape[0]
+        self.matrix = sparse.vstack([matrix, vectors], format='csr')
+        self.recipe_ids = np.concatenate([
+            self.recipe_ids, np.array(existing, dtype=np.int64)
+        ])
+        for offset, recipe_id in enumerate(existing):
+            self.rows[recipe_id] = first_row + offset
+        return np.arange(first_row, first_row + len(existing))
+
+
+feature_matrix = FeatureMatrix()
+
+
+def _top_k(similarities, recipe_ids, row_id, top_k):
+    """Ближайшие соседи для одной строки разреженного результата."""
+    import numpy as np
+
+    indices, scores = similarities.indices, similarities.data
+    mask = recipe_ids[indices] != row_id
+    indices, scores = indices[mask], scores[mask]
+    if len(scores) > top_k:
+        best = np.argpartition(-scores, top_k)[:top_k]
+        indices, scores = indices[best], scores[best]
+    order = np.argsort(-scores, kind='stable')
+    return [
+        (int(recipe_ids[index]), float(score))
+        for index, score in zip(indices[order], scores[order])
+    ]
+
+
+def _store(neighbours):
+    """
+    Заменить сохраненных соседей для рецептов из neighbours. Записи
+    процесса идут по очереди; если параллельно пишет другой процесс,
+    совпадающие пары пропускаются, а лишние строки отсекает чтение
+    top-K по score.
+    """
+    with _store_lock, transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id__in=neighbours).delete()
+        SimilarRecipe.objects.bulk_create(
+            (
+                SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                              score=score)
+                for recipe_id, items in neighbours.items()
+                for similar_id, score in items
+            ),
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+
+def compute_all(top_k=None, batch_size=None):
+    """Пересчитать похожие рецепты для всего каталога блоками строк."""
+    top_k = top_k or settings.SIMILAR_RECIPES_TOP_K
+    batch_size = batch_size or settings.SIMILAR_RECIPES_BATCH_SIZE
+    matrix, recipe_ids, _ = build_matrix()
+    transposed = matrix.T
+    for start in range(0, len(recipe_ids), batch_size):
+        block = (matrix[start:start + batch_size] @ transposed).tocsr()
+        _store({
+            int(recipe_ids[start + offset]): _top_k(
+                block[offset], recipe_ids,
+                recipe_ids[start + offset], top_k
+            )
+            for offset in range(block.shape[0])
+        })
+    return len(recipe_ids)
+
+
+def update_recipes(changed_ids, top_k=None):
+    """
+    Инкрементальное обновление для новых и измененных рецептов:
+    из БД читаются только их ингредиенты и теги, строки заменяются в
+    матрице процесса (FeatureMatrix), пересчитываются их соседи, а сами
+    рецепты встраиваются в списки соседей других рецептов, если
+    проходят в их top-K.
+    """
+    top_k = top_k or settings.SIMILAR_RECIPES_TOP_K
+    with feature_matrix.lock:
+        feature_matrix.load()
+        positions = feature_matrix.replace(set(changed_ids))
+        matrix = feature_matrix.matrix
+        recipe_ids = feature_matrix.recipe_ids.copy()
+        block = (matrix[positions] @ matrix.T).tocsr()
+
+    neighbours = {}
+    reverse = {}
+    for offset, position in enumerate(positions):
+        recipe_id = int(recipe_ids[position])
+        neighbours[recipe_id] = _top_k(
+            block[offset], recipe_ids, recipe_id, top_k
+        )
+        for similar_id, score in _top_k(
+            block[offset], recipe_ids, recipe_id, top_k * 4
+        ):
+            reverse.setdefault(similar_id, {})[recipe_id] = score
+
+    current = {}
+    rows = SimilarRecipe.objects.filter(
+        recipe_id__in=reverse
+    ).values_list('recipe_id', 'similar_id', 'score')
+    for recipe_id, similar_id, score in rows:
+        current.setdefault(recipe_id, {})[similar_id] = score
+    for recipe_id, candidates in reverse.items():
+        if recipe_id in neighbours:
+            continue
+        merged = {
+            similar_id: score
+            for similar_id, score in current.get(recipe_id, {}).items()
+            if similar_id not in changed_ids
+        }
+        merged.update(candidates)
+        best = sorted(merged.items(), key=lambda item: -item[1])[:top_k]
+        if best != sorted(
+            current.get(recipe_id, {}).items(), key=lambda item: -item[1]
+        ):
+            neighbours[recipe_id] = best
+    _store(neighbours)
+
+
+def _process_pending():
+    with _pending_lock:
+        recipe_ids = set(_pending)
+        _pending.clear()
+    if recipe_ids:
+        update_recipes(recipe_ids)
+
+
+def schedule_update(recipe_id):
+    """
+    Поставить рецепт в очередь инкрементального пересчета. Рецепты,
+    накопившиеся до запуска задачи, обрабатываются одним проходом.
+    """
+    from .tasks import run_on_commit
+
+    if not settings.SIMILAR_RECIPES_ON_WRITE:
+        return
+    try:
+        import numpy  # noqa: F401
+        import scipy  # noqa: F401
+    except ImportError:
+        logger.debug('numpy/scipy не установлены, похожие рецепты '
+                     'обновляются только командой.')
+        return
+    with _pending_lock:
+        _pending.add(recipe_id)
+    run_on_commit(_process_pending)
@@ -0,0 +1,68 @@
+import hashlib
+import os
+import time
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла - это SHA-256 его содержимого.
+
+    Одинаковые файлы сохраняются один раз, а содержимое по конкретному
+    адресу никогда не меняется, поэтому его можно кешировать навсегда.
+    Имя строится как <каталог>/<2 символа хеша>/<хеш><расширение>.
+    Повторное сохранение уже существующего файла обновляет время его
+    изменения: по нему delete_unused не удаляет файл, на который вот-вот
+    сошлется новый рецепт.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def hashed_name(self, name, content):
+        """Имя файла по его содержимому."""
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        hex_digest = digest.hexdigest()
+        return os.path.join(
+            directory, hex_digest[:2], hex_digest + extension
+        ).replace('\\', '/')
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        try:
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+        tmp_name = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(tmp_name), self.path(name))
+        return name
+
+    def delete_unused(self, name, grace):
+        """
+        Удалить файл, если он не сохранялся повторно последние grace
+        секунд. Файл сначала атомарно переименовывается: _save, который
+        придет после этого, запишет файл заново, а не вернет имя
+        удаляемого. Возвращает True, если файл удален.
+        """
+        path = self.path(name)
+        trash_path = f'{path}.{uuid.uuid4().hex}.deleted'
+        try:
+            os.replace(path, trash_path)
+        except FileNotFoundError:
+            return False
+        if os.stat(trash_path).st_mtime > time.time() - grace:
+            # Файл только что сохранен заново. Если _save успел записать
+            # его повторно, содержимое то же самое.
+            os.replace(trash_path, path)
+            return False
+        os.remove(trash_path)
+        return True
@@ -0,0 +1,70 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from foodgram.db_health import close_unusable_connections
+
+logger = logging.getLogger(__name__)
+
+# Пулы потоков: имя -> настройка с числом потоков. Долгие задачи
+# (удаление юзеров и рецептов) идут в свой пул и не задерживают короткие.
+POOLS = {
+    'default': 'BACKGROUND_WORKERS',
+    'purge': 'PURGE_WORKERS',
+}
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def get_executor(pool='default'):
+    """
+    Пул потоков для фоновых задач текущего процесса.
+    После fork (gunicorn --preload) создается заново.
+    """
+    key = (pool, os.getpid())
+    with _lock:
+        if key not in _executors:
+            _executors[key] = ThreadPoolExecutor(
+                max_workers=getattr(settings, POOLS[pool]),
+                thread_name_prefix=f'foodgram-{pool}',
+            )
+    return _executors[key]
+
+
+def _run(func, args, kwargs):
+    """
+    Соединения потоков пула живут по тем же правилам CONN_MAX_AGE,
+    что и в запросах, поэтому задачи не открывают их каждый раз заново.
+    """
+    close_old_connections()
+    close_unusable_connections()
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Ошибка фоновой задачи %s', func.__name__)
+    finally:
+        close_old_connections()
+
+
+def run_in_pool(pool, func, *args, **kwargs):
+    """Выполнить функцию в фоновом потоке пула pool."""
+    if settings.BACKGROUND_TASKS_EAGER:
+        return func(*args, **kwargs)
+    return get_executor(pool).submit(_run, func, args, kwargs)
+
+
+def run_in_background(func, *args, **kwargs):
+    """Выполнить функцию в фоновом потоке, не задерживая запрос."""
+    return run_in_pool('default', func, *args, **kwargs)
+
+
+def run_on_commit(func, *args, pool='default', **kwargs):
+    """Поставить фоновую задачу после фиксации текущей транзакции."""
+    transaction.on_commit(
+        lambda: run_in_pool(pool, func, *args, **kwargs)
+    )
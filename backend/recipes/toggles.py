@@ -0,0 +1,258 @@
+import atexit
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import (BooleanField, Case, Exists, OuterRef, Q,
+                              Value, When)
+
+from .models import Favorite, ShoppingCart
+from .popularity import change_popularity_bulk, get_weight
+
+logger = logging.getLogger(__name__)
+
+MODELS = {'favorite': Favorite, 'shoppingcart': ShoppingCart}
+PENDING_CACHE_KEY = 'toggles:{}'
+PENDING_SLOT_CACHE_KEY = 'toggles:{}:{}'
+
+
+def get_pending(user_id):
+    """
+    Еще не записанные в БД изменения избранного и корзины юзера:
+    {'favorite': {recipe_id: True/False}, 'shoppingcart': {...}}.
+    Хранятся в общем кеше, чтобы их видели все воркеры: каждое
+    изменение в своем слоте под номером из счетчика юзера, читаются
+    последние TOGGLE_PENDING_SLOTS слотов, более поздние главнее.
+    """
+    if not settings.TOGGLE_WRITE_BEHIND:
+        return {}
+    count = cache.get(PENDING_CACHE_KEY.format(user_id))
+    if not count:
+        return {}
+    keys = [
+        PENDING_SLOT_CACHE_KEY.format(user_id, number)
+        for number in range(
+            max(1, count - settings.TOGGLE_PENDING_SLOTS + 1), count + 1
+        )
+    ]
+    slots = cache.get_many(keys)
+    pending = {}
+    for key in keys:
+        if key in slots:
+            kind, recipe_id, value = slots[key]
+            pending.setdefault(kind, {})[recipe_id] = value
+    return pending
+
+
+def add_pending(user_id, kind, recipe_id, value):
+    """
+    Записать изменение в новый слот юзера. Номер слота выдает
+    cache.incr, поэтому воркеры не перезаписывают изменения друг друга.
+    """
+    key = PENDING_CACHE_KEY.format(user_id)
+    cache.add(key, 0, settings.TOGGLE_PENDING_TIMEOUT)
+    try:
+        number = cache.incr(key)
+    except ValueError:
+        # Счетчик истек между add и incr.
+        cache.add(key, 0, settings.TOGGLE_PENDING_TIMEOUT)
+        number = cache.incr(key)
+    slot = PENDING_SLOT_CACHE_KEY.format(user_id, number)
+    cache.set(
+        slot, (kind, recipe_id, value), settings.TOGGLE_PENDING_TIMEOUT
+    )
+    return slot
+
+
+def get_overlay(user, model):
+    """Множества id рецептов, добавленных и удаленных в буфере."""
+    if not user.is_authenticated:
+        return set(), set()
+    pending = get_pending(user.id).get(model._meta.model_name, {})
+    added = {recipe_id for recipe_id, value in pending.items() if value}
+    return added, set(pending) - added
+
+
+def is_member(user, model, recipe_id):
+    """Есть ли рецепт в списке юзера с учетом буфера."""
+    added, removed = get_overlay(user, model)
+    if recipe_id in added:
+        return True
+    if recipe_id in removed:
+        return False
+    return model.objects.filter(user=user, recipe_id=recipe_id).exists()
+
+
+def membership_q(user, model):
+    """
+    Условие на рецепты из списка юзера с учетом буфера: сохраненные
+    в БД плюс добавленные и минус удаленные в буфере.
+    """
+    added, removed = get_overlay(user, model)
+    return (
+        Q(id__in=model.objects.filter(user=user).values('recipe'))
+        | Q(id__in=added)
+    ) & ~Q(id__in=removed)
+
+
+def membership_annotation(user, model):
+    """Аннотация is_favorited/is_in_shopping_cart с учетом буфера."""
+    exists = Exists(model.objects.filter(user=user, recipe=OuterRef('id')))
+    added, removed = get_overlay(user, model)
+    if not added and not removed:
+        return exists
+    return Case(
+        When(id__in=added, then=Value(True)),
+        When(id__in=removed, then=Value(False)),
+        default=exists,
+        output_field=BooleanField(),
+    )
+
+
+class ToggleBuffer:
+    """
+    Буфер добавлений и удалений в избранное и корзину процесса.
+    Повторные переключения одной пары юзер-рецепт схлопываются,
+    буфер записывается в БД фоновым потоком раз в
+    TOGGLE_FLUSH_INTERVAL_MS или при накоплении TOGGLE_FLUSH_MAX_ITEMS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._items = {}
+        self._pid = None
+
+    def _ensure_worker(self):
+        """Поток записи создается заново после fork."""
+        if self._pid == os.getpid():
+            return
+        self._items = {}
+        self._pid = os.getpid()
+        thread = threading.Thread(
+            target=self._loop, name='foodgram-toggles', daemon=True
+        )
+        thread.start()
+
+    def _loop(self):
+        interval = settings.TOGGLE_FLUSH_INTERVAL_MS / 1000
+        while True:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Ошибка записи буфера избранного')
+
+    def add(self, model, user_id, recipe_id, value):
+        """Поставить добавление (value=True) или удаление в буфер."""
+        kind = model._meta.model_name
+        slot = add_pending(user_id, kind, recipe_id, value)
+        with self._lock:
+            self._ensure_worker()
+            key = (kind, user_id, recipe_id)
+            _, slots = self._items.get(key, (None, []))
+            self._items[key] = (value, slots + [slot])
+            full = len(self._items) >= settings.TOGGLE_FLUSH_MAX_ITEMS
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Записать накопленные изменения пакетами. Если пакет нарушает
+        ограничения БД (например, рецепт уже удален), изменения пишутся
+        по одному и пропускаются только ошибочные. При других ошибках
+        незаписанные изменения возвращаются в буфер.
+        """
+        with self._lock:
+            items, self._items = self._items, {}
+        if not items:
+            return 0
+        try:
+            self._write(items)
+            done = set(items)
+        except IntegrityError:
+            done = set()
+            try:
+                for key in items:
+                    try:
+                        self._write({key: items[key]})
+                    except IntegrityError:
+                        logger.warning('Изменение %s не записано', key)
+                    done.add(key)
+            except Exception:
+                self._restore(items, done)
+                raise
+        except Exception:
+            self._restore(items, set())
+            raise
+        cache.delete_many([
+            slot for key in done for slot in items[key][1]
+        ])
+        return len(done)
+
+    def _restore(self, items, done):
+        """Вернуть в буфер незаписанные изменения, новые главнее."""
+        with self._lock:
+            for key, (value, slots) in items.items():
+                if key in done:
+                    continue
+                if key in self._items:
+                    value, newer = self._items[key]
+                    slots = slots + newer
+                self._items[key] = (value, slots)
+
+    def _write(self, items):
+        grouped = defaultdict(lambda: ([], []))
+        for (kind, user_id, recipe_id), (value, _) in items.items():
+            grouped[kind][0 if value else 1].append((user_id, recipe_id))
+        deltas = defaultdict(float)
+        with transaction.atomic():
+            for kind, (added, removed) in grouped.items():
+                model = MODELS[kind]
+                weight = get_weight(model)
+                added = set(added) - self._existing(model, added)
+                model.objects.bulk_create(
+                    (
+                        model(user_id=user_id, recipe_id=recipe_id)
+                        for user_id, recipe_id in added
+                    ),
+                    batch_size=settings.TOGGLE_FLUSH_MAX_ITEMS,
+                    ignore_conflicts=True,
+                )
+                removed = self._existing(model, removed)
+                if removed:
+                    model.objects.filter(self._pairs_q(removed)).delete()
+                for _, recipe_id in added:
+                    deltas[recipe_id] += weight
+                for _, recipe_id in removed:
+                    deltas[recipe_id] -= weight
+            change_popularity_bulk(deltas)
+
+    @staticmethod
+    def _pairs_q(pairs):
+        recipes_by_user = defaultdict(list)
+        for user_id, recipe_id in pairs:
+            recipes_by_user[user_id].append(recipe_id)
+        query = Q()
+        for user_id, recipe_ids in recipes_by_user.items():
+            query |= Q(user_id=user_id, recipe_id__in=recipe_ids)
+        return query
+
+    def _existing(self, model, pairs):
+        """Пары юзер-рецепт из pairs, которые уже есть в БД."""
+        if not pairs:
+            return set()
+        return set(
+            model.objects.filter(self._pairs_q(pairs))
+            .values_list('user_id', 'recipe_id')
+        )
+
+
+toggle_buffer = ToggleBuffer()
+atexit.register(toggle_buffer.flush)
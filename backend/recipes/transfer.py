@@ -0,0 +1,320 @@
+import base64
+import json
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from .bulk import create_recipes
+from .models import Ingredient, Recipe, RecipeIngredient, Tag
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+User = get_user_model()
+
+
+def dumps_line(item):
+    """Строка NDJSON: orjson, без него - json в том же компактном виде."""
+    if orjson is not None:
+        return orjson.dumps(item) + b'\n'
+    return json.dumps(
+        item, ensure_ascii=False, separators=(',', ':')
+    ).encode() + b'\n'
+
+
+def loads_line(line):
+    """Объект из строки NDJSON, при ошибке - ValueError."""
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def _related(recipe_ids):
+    """Теги и ингредиенты пачки рецептов двумя запросами."""
+    tags, ingredients = {}, {}
+    tag_rows = (
+        Recipe.tags.through.objects
+        .filter(recipe_id__in=recipe_ids)
+        .values_list('recipe_id', 'tag__slug', 'tag__name', 'tag__color')
+    )
+    for recipe_id, slug, name, color in tag_rows:
+        tags.setdefault(recipe_id, []).append(
+            {'slug': slug, 'name': name, 'color': color}
+        )
+    ingredient_rows = (
+        RecipeIngredient.objects
+        .filter(recipe_id__in=recipe_ids)
+        .order_by('id')
+        .values_list('recipe_id', 'ingredient__name',
+                     'ingredient__unit_of_measurement', 'amount')
+    )
+    for recipe_id, name, unit, amount in ingredient_rows:
+        ingredients.setdefault(recipe_id, []).append(
+            {'name': name, 'measurement_unit': unit, 'amount': amount}
+        )
+    return tags, ingredients
+
+
+def export_lines(after_id=0, batch_size=1000, with_images=False):
+    """
+    Строки NDJSON с рецептами по возрастанию id, по одному
+    самодостаточному рецепту на строку. Рецепты читаются
+    серверным курсором, связанные данные - пачками по batch_size.
+    """
+    rows = (
+        Recipe.objects
+        .filter(id__gt=after_id, deleted_at__isnull=True)
+        .order_by('id')
+        .values('id', 'name', 'text', 'cooking_time', 'pub_date', 'image',
+                'author__username', 'author__email',
+                'author__first_name', 'author__last_name')
+        .iterator(chunk_size=batch_size)
+    )
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield from _export_batch(batch, with_images)
+            batch = []
+    if batch:
+        yield from _export_batch(batch, with_images)
+
+
+def _export_batch(batch, with_images):
+    tags, ingredients = _related([row['id'] for row in batch])
+    for row in batch:
+        item = {
+            'id': row['id'],
+            'name': row['name'],
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+            'pub_date': row['pub_date'].isoformat(),
+            'author': {
+                'username': row['author__username'],
+                'email': row['author__email'],
+                'first_name': row['author__first_name'],
+                'last_name': row['author__last_name'],
+            },
+            'tags': tags.get(row['id'], []),
+            'ingredients': ingredients.get(row['id'], []),
+            'image': row['image'] or None,
+        }
+        if with_images and row['image'] and default_storage.exists(
+            row['image']
+        ):
+            with default_storage.open(row['image'], 'rb') as file:
+                item['image_data'] = base64.b64encode(file.read()).decode()
+        yield dumps_line(item)
+
+
+class Checkpoint:
+    """
+    Позиция импорта в файле: смещение после последней записанной
+    пачки. Записывается атомарно после фиксации транзакции пачки;
+    если запись не успела, пачка загружается повторно, и уже
+    загруженные рецепты пропускаются (RecipeImporter._loaded).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset, self.imported = 0, 0
+
+    def load(self):
+        if self.path and os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as file:
+                data = json.load(file)
+            self.offset, self.imported = data['offset'], data['imported']
+
+    def save(self, offset, imported):
+        self.offset, self.imported = offset, imported
+        if not self.path:
+            return
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'offset': offset, 'imported': imported}, file)
+        os.replace(tmp_path, self.path)
+
+
+class RecipeImporter:
+    """
+    Импорт пачки рецептов: теги, ингредиенты и авторы находятся одним
+    запросом каждый, недостающие теги и ингредиенты создаются,
+    рецепты и связи вставляются bulk_create в одной транзакции.
+    Изображения сохраняются после ее фиксации, поэтому пачка
+    с ошибкой не оставляет файлов.
+    """
+
+    def __init__(self, stdout=None):
+        self.stdout = stdout
+        self.skipped = 0
+
+    def _authors(self, items):
+        emails = {item['author']['email'] for item in items}
+        return dict(
+            User.objects.filter(email__in=emails).values_list('email', 'id')
+        )
+
+    def _tags(self, items):
+        """
+        id тегов по slug. Тег, который нельзя создать (например, цвет
+        занят другим тегом), в результат не попадает и пропускается.
+        """
+        tags = {
+            tag['slug']: tag for item in items for tag in item['tags']
+        }
+        existing = dict(
+            Tag.objects.filter(slug__in=tags).values_list('slug', 'id')
+        )
+        missing = [
+            Tag(**tag) for slug, tag in tags.items() if slug not in existing
+        ]
+        if missing:
+            Tag.objects.bulk_create(missing, ignore_conflicts=True)
+            existing = dict(
+                Tag.objects.filter(slug__in=tags).values_list('slug', 'id')
+            )
+        return existing
+
+    def _ingredients(self, items):
+        keys = {
+            (ingredient['name'], ingredient['measurement_unit'])
+            for item in items for ingredient in item['ingredients']
+        }
+        names = {name for name, _ in keys}
+
+        def load():
+            return {
+                (name, unit): ingredient_id
+                for ingredient_id, name, unit in Ingredient.objects.filter(
+                    name__in=names
+                ).values_list('id', 'name', 'unit_of_measurement')
+            }
+
+        existing = load()
+        missing = [
+            Ingredient(name=name, unit_of_measurement=unit)
+            for name, unit in keys if (name, unit) not in existing
+        ]
+        if missing:
+            Ingredient.objects.bulk_create(missing)
+            existing = load()
+        return existing
+
+    @staticmethod
+    def _loaded(items, authors):
+        """
+        Рецепты пачки, которые уже есть в БД: ключ - автор, название
+        и дата публикации.
+        """
+        return set(
+            Recipe.objects.filter(
+                author_id__in=set(authors.values()),
+                pub_date__in={item['pub_date'] for item in items},
+            ).values_list('author_id', 'name', 'pub_date')
+        )
+
+    @staticmethod
+    def _image_file(item):
+        """Имя и содержимое изображения из файла экспорта."""
+        data = item.get('image_data')
+        if not data:
+            return None
+        name = os.path.basename(item.get('image') or 'image.jpg')
+        return f'recipes/{name}', ContentFile(base64.b64decode(data))
+
+    def import_batch(self, items):
+        """Записать пачку рецептов, вернуть число импортированных."""
+        authors = self._authors(items)
+        accepted = []
+        for item in items:
+            if item['author']['email'] in authors:
+                accepted.append(item)
+            else:
+                self.skipped += 1
+                if self.stdout is not None:
+                    self.stdout.write(
+                        f'Пропущен рецепт {item.get("id")}: нет автора '
+                        f'{item["author"]["email"]}'
+                    )
+        if not accepted:
+            return 0
+        for item in accepted:
+            item['pub_date'] = parse_datetime(item['pub_date'])
+        files = [self._image_file(item) for item in accepted]
+        with transaction.atomic():
+            loaded = self._loaded(accepted, authors)
+            new = [
+                (item, file) for item, file in zip(accepted, files)
+                if (
+                    authors[item['author']['email']], item['name'],
+                    item['pub_date']
+                ) not in loaded
+            ]
+            self.skipped += len(accepted) - len(new)
+            if not new:
+                return 0
+            accepted, files = map(list, zip(*new))
+            tags = self._tags(accepted)
+            ingredients = self._ingredients(accepted)
+            recipes, _ = create_recipes([
+                Recipe(
+                    author_id=authors[item['author']['email']],
+                    name=item['name'],
+                    text=item['text'],
+                    cooking_time=item['cooking_time'],
+                    image=None if file else item.get('image') or None,
+                )
+                for item, file in zip(accepted, files)
+            ])
+            for recipe, item in zip(recipes, accepted):
+                recipe.pub_date = item['pub_date']
+            Recipe.objects.bulk_update(recipes, ['pub_date'])
+            Recipe.tags.through.objects.bulk_create([
+                Recipe.tags.through(
+                    recipe_id=recipe.id, tag_id=tags[tag['slug']]
+                )
+                for recipe, item in zip(recipes, accepted)
+                for tag in item['tags'] if tag['slug'] in tags
+            ])
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe_id=recipe.id,
+                    ingredient_id=ingredients[
+                        ingredient['name'], ingredient['measurement_unit']
+                    ],
+                    amount=ingredient['amount'],
+                )
+                for recipe, item in zip(recipes, accepted)
+                for ingredient in item['ingredients']
+            ])
+        with_images = []
+        for recipe, file in zip(recipes, files):
+            if file is not None:
+                recipe.image = default_storage.save(*file)
+                with_images.append(recipe)
+        Recipe.objects.bulk_update(with_images, ['image'])
+        return len(recipes)
+
+
+class Throughput:
+    """Счетчик скорости для отчетов команд экспорта и импорта."""
+
+    def __init__(self, initial=0):
+        self.started = time.perf_counter()
+        self.initial = initial
+        self.count = initial
+
+    def add(self, count):
+        self.count += count
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        rate = (self.count - self.initial) / elapsed if elapsed else 0
+        return f'{self.count} рецептов, {rate:.0f} рецептов/с'
@@ -0,0 +1,107 @@
+import pytest
+from django.contrib.auth import get_user_model
+
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import OutboxEmail, Subscription
+
+User = get_user_model()
+
+CHANGELISTS = (
+    '/admin/users/user/',
+    '/admin/users/user/?q=user1',
+    '/admin/users/subscription/',
+    '/admin/users/outboxemail/',
+    '/admin/recipes/tag/',
+    '/admin/recipes/ingredient/',
+    '/admin/recipes/ingredient/?q=ing1',
+    '/admin/recipes/recipe/',
+    '/admin/recipes/recipe/?q=recipe1',
+    '/admin/recipes/favorite/',
+    '/admin/recipes/shoppingcart/',
+)
+MAX_QUERIES = 6
+
+
+def create_rows(count):
+    """count строк в каждой таблице админки."""
+    start = User.objects.count()
+    User.objects.bulk_create(
+        User(
+            username=f'user{start + index}',
+            email=f'user{start + index}@foodgram.ru',
+            first_name='Имя', last_name='Фамилия',
+        )
+        for index in range(count)
+    )
+    # SQLite не возвращает id из bulk_create.
+    users = list(User.objects.order_by('id')[start:])
+    Tag.objects.bulk_create(
+        Tag(
+            name=f'tag{start + index}', color=f'#{start + index:06d}',
+            slug=f'tag{start + index}',
+        )
+        for index in range(count)
+    )
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'ing{start + index}', unit_of_measurement='г')
+        for index in range(count)
+    )
+    Recipe.objects.bulk_create(
+        Recipe(author=user, name=f'recipe{user.id}', cooking_time=10)
+        for user in users
+    )
+    recipes = list(Recipe.objects.filter(author__in=users).order_by('id'))
+    pairs = list(zip(users, recipes[1:] + recipes[:1]))
+    Favorite.objects.bulk_create(
+        Favorite(user=user, recipe=recipe) for user, recipe in pairs
+    )
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=user, recipe=recipe) for user, recipe in pairs
+    )
+    Subscription.objects.bulk_create(
+        Subscription(user=user, author=recipe.author)
+        for user, recipe in pairs
+    )
+    OutboxEmail.objects.bulk_create(
+        OutboxEmail(subject='Тема', recipients=user.email, message={})
+        for user in users
+    )
+
+
+def count_queries(client, url, django_assert_max_num_queries):
+    with django_assert_max_num_queries(MAX_QUERIES) as context:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(context.captured_queries)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', CHANGELISTS)
+def test_changelist_queries_do_not_grow(
+    admin_client, url, django_assert_max_num_queries
+):
+    create_rows(5)
+    small = count_queries(admin_client, url, django_assert_max_num_queries)
+    create_rows(50)
+    large = count_queries(admin_client, url, django_assert_max_num_queries)
+
+    assert large == small
+
+
+@pytest.mark.django_db
+def test_recipe_changelist_counts_favorites(admin_client):
+    create_rows(3)
+    recipe = Recipe.objects.first()
+    Favorite.objects.bulk_create(
+        Favorite(user=user, recipe=recipe)
+        for user in User.objects.exclude(favorite__recipe=recipe)
+    )
+
+    response = admin_client.get('/admin/recipes/recipe/')
+
+    counts = {
+        item.id: item.favorites_count
+        for item in response.context['cl'].result_list
+    }
+    assert counts[recipe.id] == recipe.favorite.count()
+    assert set(counts.values()) <= {1, recipe.favorite.count()}
@@ -0,0 +1,70 @@
+import psycopg2
+import pytest
+from django.db import connection
+
+from foodgram.db_pool.base import ConnectionPool
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.skipif(
+        connection.vendor != 'postgresql', reason='Пул только для PostgreSQL'
+    ),
+]
+
+
+def terminate(pids):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_terminate_backend(pid) FROM pg_stat_activity '
+            'WHERE pid = ANY(%s)', [list(pids)]
+        )
+
+
+@pytest.fixture
+def pool(settings):
+    settings.DB_CONN_HEALTH_CHECKS = True
+    settings.DB_POOL_MIN_SIZE = 3
+    settings.DB_POOL_MAX_SIZE = 3
+    settings.DB_POOL_TIMEOUT = 1
+    pool = ConnectionPool(connection.get_connection_params())
+    yield pool
+    pool.pool.closeall()
+
+
+def test_pool_skips_all_broken_connections(pool):
+    taken = [pool.getconn() for _ in range(3)]
+    pids = {item.get_backend_pid() for item in taken}
+    for item in taken:
+        pool.putconn(item)
+    terminate(pids)
+
+    alive = pool.getconn()
+
+    with alive.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        assert cursor.fetchone() == (1,)
+    assert alive.get_backend_pid() not in pids
+    pool.putconn(alive)
+
+
+def test_pool_returns_alive_connection_unchanged(pool):
+    first = pool.getconn()
+    pid = first.get_backend_pid()
+    pool.putconn(first)
+
+    second = pool.getconn()
+
+    assert second.get_backend_pid() == pid
+    pool.putconn(second)
+
+
+def test_pool_slot_is_released_on_error(settings):
+    settings.DB_POOL_MIN_SIZE = 0
+    settings.DB_POOL_MAX_SIZE = 1
+    settings.DB_POOL_TIMEOUT = 1
+    pool = ConnectionPool(dict(
+        connection.get_connection_params(), database='missing_database'
+    ))
+    for _ in range(2):
+        with pytest.raises(psycopg2.OperationalError, match='missing'):
+            pool.getconn()
@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.core.cache import cache
+
+from api.throttling import CacheBuckets, LocalBuckets
+
+CAPACITY = 50
+DURATION = 60
+NOW = 1000.0
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.mark.parametrize('buckets_class', [LocalBuckets, CacheBuckets])
+def test_concurrent_requests_do_not_exceed_limit(buckets_class):
+    buckets = buckets_class()
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        waits = list(executor.map(
+            lambda _: buckets.take('read:ip:1', CAPACITY, DURATION, NOW),
+            range(CAPACITY * 4)
+        ))
+
+    assert waits.count(None) == CAPACITY
+    assert all(wait > 0 for wait in waits if wait is not None)
+
+
+def test_cache_buckets_slide_over_previous_window():
+    buckets = CacheBuckets()
+    for _ in range(CAPACITY):
+        assert buckets.take('key', CAPACITY, DURATION, NOW) is None
+
+    # Половина следующего окна: от прошлого окна осталась половина.
+    later = (NOW // DURATION + 1.5) * DURATION
+    allowed = [
+        buckets.take('key', CAPACITY, DURATION, later) for _ in range(CAPACITY)
+    ].count(None)
+
+    assert allowed == CAPACITY // 2
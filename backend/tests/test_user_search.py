@@ -0,0 +1,97 @@
+import base64
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+User = get_user_model()
+
+URL = '/api/users/'
+
+
+def cursor(position, reverse=False):
+    data = {'p': position}
+    if reverse:
+        data['r'] = 1
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+@pytest.fixture
+def users():
+    return User.objects.bulk_create(
+        User(
+            username=username, email=f'{username}@foodgram.ru',
+            first_name=first_name, last_name='Фамилия',
+        )
+        for username, first_name in (
+            ('anna', 'Анна'), ('annette', 'Аннет'), ('bob', 'Ann'),
+            ('joanna', 'Жанна'), ('zed', 'Зед'),
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_search_pages_keep_order_and_count(client, users):
+    expected = ['anna', 'annette', 'bob']
+    if connection.vendor == 'postgresql':
+        # Совпадение по подстроке username ищется только на PostgreSQL.
+        expected.append('joanna')
+
+    response = client.get(URL, {'search': 'ANN', 'limit': 2})
+    data = response.json()
+    names = [user['username'] for user in data['results']]
+    while data['next']:
+        data = client.get(data['next']).json()
+        names += [user['username'] for user in data['results']]
+
+    assert response.json()['count'] == len(expected)
+    assert list(response.json()) == ['count', 'next', 'previous', 'results']
+    assert names == expected
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('position', [
+    [0, 'anna'],
+    ['0', 'anna', 1],
+    [0, 5, 1],
+    [True, 'anna', 1],
+    [0, 'anna', 2 ** 70],
+    [0, 'an\x00na', 1],
+    'anna',
+])
+def test_invalid_cursor_is_not_found(client, users, position):
+    response = client.get(URL, {'search': 'ann', 'cursor': cursor(position)})
+
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_garbage_cursor_is_not_found(client, users):
+    response = client.get(URL, {'search': 'ann', 'cursor': '%%%'})
+
+    assert response.status_code == 404
+
+
+@pytest.mark.skipif(connection.vendor == 'sqlite', reason='Уже на SQLite')
+def test_search_on_sqlite(tmp_path):
+    """Тесты поиска на SQLite: таблица юзеров и поиск без индексов PG."""
+    result = subprocess.run(
+        [sys.executable, '-m', 'pytest', '-q', __file__],
+        cwd=settings.BASE_DIR,
+        env=dict(
+            os.environ,
+            DB_ENGINE='django.db.backends.sqlite3',
+            DB_NAME=str(tmp_path / 'db.sqlite3'),
+            DB_POOL='False',
+        ),
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        universal_newlines=True,
+    )
+
+    assert result.returncode == 0, result.stdout
+    assert ' passed' in result.stdout
@@ -1,6 +1,8 @@
 from django.contrib import admin
 
-from .models import Subscription, User
+from foodgram.paginators import EstimatedCountPaginator
+
+from .models import OutboxEmail, Subscription, User
 
 
 @admin.register(User)
@@ -13,13 +15,30 @@ class UserAdmin(admin.ModelAdmin):
         'first_name',
         'last_name',
     )
-    list_filter = ('username', 'email',)
-    search_fields = ('username', 'email', 'first_name', 'last_name')
+    search_fields = ('^username', '=email')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     """Админка для модели подписок."""
     list_display = ('id', 'user', 'author')
-    list_filter = ('user', 'author')
-    search_fields = ('user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('^user__username', '^author__username')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    """Админка для очереди исходящих писем."""
+    list_display = (
+        'id', 'subject', 'recipients', 'status', 'attempts',
+        'next_attempt_at',
+    )
+    list_filter = ('status',)
+    readonly_fields = ('message', 'created_at', 'last_error')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,177 @@
+import base64
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+
+def _attachment_to_json(attachment):
+    if isinstance(attachment, tuple):
+        filename, content, mimetype = attachment
+    else:
+        filename = attachment.get_filename()
+        content = attachment.get_payload(decode=True)
+        mimetype = attachment.get_content_type()
+    if isinstance(content, str):
+        content = content.encode()
+    return [filename, base64.b64encode(content).decode(), mimetype]
+
+
+def message_to_json(message):
+    """Письмо в виде, пригодном для хранения в JSONField."""
+    return {
+        'subject': str(message.subject),
+        'body': str(message.body),
+        'from_email': message.from_email,
+        'to': list(message.to),
+        'cc': list(message.cc),
+        'bcc': list(message.bcc),
+        'reply_to': list(message.reply_to),
+        'headers': dict(message.extra_headers),
+        'alternatives': [
+            [str(content), mimetype]
+            for content, mimetype in getattr(message, 'alternatives', [])
+        ],
+        'attachments': [
+            _attachment_to_json(attachment)
+            for attachment in message.attachments
+        ],
+    }
+
+
+def message_from_json(data):
+    message = EmailMultiAlternatives(
+        subject=data['subject'],
+        body=data['body'],
+        from_email=data['from_email'],
+        to=data['to'],
+        cc=data['cc'],
+        bcc=data['bcc'],
+        reply_to=data['reply_to'],
+        headers=data['headers'],
+        alternatives=[tuple(item) for item in data['alternatives']],
+    )
+    for filename, content, mimetype in data['attachments']:
+        message.attach(filename, base64.b64decode(content), mimetype)
+    return message
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """
+    Бэкенд почты, который только записывает письма в очередь
+    OutboxEmail. Запись идет в текущей транзакции, поэтому письмо
+    уходит, только если запрос завершился успешно.
+    """
+
+    def send_messages(self, email_messages):
+        rows = [
+            OutboxEmail(
+                subject=str(message.subject)[:255],
+                recipients=', '.join(message.recipients()),
+                message=message_to_json(message),
+            )
+            for message in email_messages if message.recipients()
+        ]
+        OutboxEmail.objects.bulk_create(rows)
+        return len(rows)
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка перед повторной отправкой."""
+    return timedelta(
+        seconds=settings.EMAIL_QUEUE_RETRY_DELAY * 2 ** (attempts - 1)
+    )
+
+
+def claim_batch(batch_size):
+    """
+    Взять пачку писем, которым пришло время, в короткой транзакции:
+    письма помечаются sending до now + EMAIL_QUEUE_SEND_TIMEOUT,
+    поэтому другие воркеры их не берут. Письма воркера, который упал
+    во время отправки, по истечении этого срока берутся снова.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            OutboxEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                status__in=(OutboxEmail.PENDING, OutboxEmail.SENDING),
+                next_attempt_at__lte=now,
+            )
+            .order_by('next_attempt_at', 'id')
+            [:batch_size]
+        )
+        OutboxEmail.objects.filter(id__in=[row.id for row in rows]).update(
+            status=OutboxEmail.SENDING,
+            next_attempt_at=now + timedelta(
+                seconds=settings.EMAIL_QUEUE_SEND_TIMEOUT
+            ),
+        )
+    return rows
+
+
+def defer(row, error):
+    """Отложить письмо после неудачной попытки отправки."""
+    row.attempts += 1
+    row.last_error = str(error)
+    row.status = (
+        OutboxEmail.FAILED
+        if row.attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS
+        else OutboxEmail.PENDING
+    )
+    row.next_attempt_at = timezone.now() + retry_delay(row.attempts)
+
+
+def send_queued(batch_size=None):
+    """
+    Отправить пачку писем через одно соединение EMAIL_QUEUE_BACKEND.
+    Письма берутся в короткой транзакции (claim_batch) и отправляются
+    вне ее, затем отправленные удаляются из очереди, а неотправленные
+    откладываются, после EMAIL_QUEUE_MAX_ATTEMPTS попыток помечаются
+    failed. Если соединение не открылось, откладывается вся пачка.
+    Возвращает число (отправленных, неотправленных).
+    """
+    rows = claim_batch(batch_size or settings.EMAIL_QUEUE_BATCH_SIZE)
+    if not rows:
+        return 0, 0
+    sent, failed = [], []
+    connection = get_connection(settings.EMAIL_QUEUE_BACKEND)
+    try:
+        connection.open()
+    except Exception as error:
+        logger.warning('Нет соединения для отправки писем: %s', error)
+        for row in rows:
+            defer(row, error)
+        failed = rows
+    else:
+        try:
+            for row in rows:
+                message = message_from_json(row.message)
+                message.connection = connection
+                try:
+                    message.send()
+                except Exception as error:
+                    logger.warning(
+                        'Письмо %s не отправлено: %s', row.id, error
+                    )
+                    defer(row, error)
+                    failed.append(row)
+                else:
+                    sent.append(row.id)
+        finally:
+            connection.close()
+    with transaction.atomic():
+        OutboxEmail.objects.filter(id__in=sent).delete()
+        OutboxEmail.objects.bulk_update(
+            failed, ['attempts', 'last_error', 'status', 'next_attempt_at']
+        )
+    return len(sent), len(failed)
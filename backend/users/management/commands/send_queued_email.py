@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+from users.mail import send_queued
+
+
+class Command(BaseCommand):
+    """
+    Команда для отправки писем из очереди. С --loop работает
+    постоянно как отдельный воркер.
+    """
+    help = 'Send queued outbound email in batches with retries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.EMAIL_QUEUE_BATCH_SIZE,
+            help='сколько писем отправлять через одно соединение'
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='не завершаться, проверять очередь каждые --interval с'
+        )
+        parser.add_argument(
+            '--interval', type=float,
+            default=settings.EMAIL_QUEUE_POLL_INTERVAL,
+            help='пауза между проверками пустой очереди, с'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            try:
+                sent, failed = send_queued(options['batch_size'])
+            except Exception as error:
+                if not options['loop']:
+                    raise
+                self.stderr.write(f'Ошибка отправки: {error}')
+                sent, failed = 0, 0
+            if sent or failed:
+                self.stdout.write(
+                    f'Отправлено: {sent}, не отправлено: {failed}'
+                )
+            if not options['loop']:
+                break
+            if sent + failed < options['batch_size']:
+                time.sleep(options['interval'])
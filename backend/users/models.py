@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.db import models
+from django.db.models.functions import Lower, Upper
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -36,6 +38,12 @@ class User(AbstractUser):
         max_length=128,
         verbose_name='Пароль'
     )
+    deleted_at = models.DateTimeField(
+        verbose_name='Удален',
+        null=True,
+        blank=True,
+        editable=False
+    )
 
     class Meta:
         ordering = ('-id',)
@@ -47,6 +55,15 @@ class User(AbstractUser):
                 name='username_email'
             ),
         ]
+        indexes = [
+            models.Index(Upper('username'), name='user_username_upper_idx'),
+            models.Index(Upper('email'), name='user_email_upper_idx'),
+            models.Index(Lower('username'), name='user_username_lower_idx'),
+            models.Index(
+                Lower('first_name'), name='user_first_name_lower_idx'
+            ),
+            models.Index(Lower('last_name'), name='user_last_name_lower_idx'),
+        ]
 
 
 class Subscription(models.Model):
@@ -79,3 +96,66 @@ class Subscription(models.Model):
 
     def __str__(self):
         return f"{self.user} подписка на {self.author}"
+
+
+class OutboxEmail(models.Model):
+    """
+    Модель очереди исходящих писем. Письма записываются в запросе
+    и отправляются командой send_queued_email.
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Ожидает отправки'),
+        (SENDING, 'Отправляется'),
+        (FAILED, 'Не отправлено'),
+    )
+    subject = models.CharField(
+        verbose_name='Тема',
+        max_length=255,
+        blank=True
+    )
+    recipients = models.TextField(
+        verbose_name='Получатели',
+        blank=True
+    )
+    message = models.JSONField(
+        verbose_name='Письмо'
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=16,
+        choices=STATUSES,
+        default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='Попыток отправки',
+        default=0
+    )
+    next_attempt_at = models.DateTimeField(
+        verbose_name='Следующая попытка',
+        default=timezone.now
+    )
+    last_error = models.TextField(
+        verbose_name='Последняя ошибка',
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Создано',
+        auto_now_add=True
+    )
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+        indexes = [
+            models.Index(
+                fields=['status', 'next_attempt_at'],
+                name='outbox_status_next_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} для {self.recipients}'
@@ -0,0 +1,463 @@
+"""
+Нагрузочный тест всего стека (gunicorn + Django + БД) против запущенного
+сервера. Только стандартная библиотека Python.
+
+Смесь сценариев задается весами: анонимный просмотр рецептов с фильтром
+по тегам, автодополнение ингредиентов, добавление и удаление из
+избранного и корзины, список подписок и скачивание списка покупок.
+Перед запуском создаются тестовые юзеры, после - удаляются.
+Результат - JSON с RPS, p50/p95/p99 и ошибками по каждому эндпоинту.
+
+    python infra/loadtest.py --base-url http://127.0.0.1:8000 \\
+        --duration 60 --concurrency 16 --output before.json
+    python infra/loadtest.py ... --output after.json --compare before.json
+
+Лимиты частоты запросов сервера (THROTTLE_RATE_*) для теста нужно
+поднять, иначе большая часть запросов получит 429.
+"""
+import argparse
+import gzip
+import http.client
+import json
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+DEFAULT_MIX = (
+    'browse=50,autocomplete=20,toggle=15,subscriptions=10,shopping_list=5'
+)
+LIST_LIMIT = 6
+RETRY_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+class Client:
+    """HTTP-клиент потока с keep-alive и переподключением."""
+
+    def __init__(self, base_url, token=None, timeout=30):
+        parts = urlsplit(base_url)
+        self.connection_class = (
+            http.client.HTTPSConnection if parts.scheme == 'https'
+            else http.client.HTTPConnection
+        )
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+        self.connection = None
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def request(self, method, path, data=None):
+        """Выполнить запрос, вернуть (статус, тело)."""
+        headers = {'Accept': 'application/json', 'Accept-Encoding': 'gzip'}
+        body = None
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = self.connection_class(
+                    self.netloc, timeout=self.timeout
+                )
+            try:
+                self.connection.request(
+                    method, self.prefix + path, body=body, headers=headers
+                )
+                response = self.connection.getresponse()
+                content = response.read()
+            except RETRY_ERRORS:
+                self.close()
+                if attempt:
+                    raise
+                continue
+            if response.getheader('Connection', '').lower() == 'close':
+                self.close()
+            if response.getheader('Content-Encoding') == 'gzip':
+                content = gzip.decompress(content)
+            return response.status, content
+
+    def json(self, method, path, data=None, expected=(200, 201)):
+        status, content = self.request(method, path, data)
+        if status not in expected:
+            raise RuntimeError(
+                f'{method} {path}: {status} {content[:200]!r}'
+            )
+        return json.loads(content) if content else None
+
+
+class Recorder:
+    """Задержки и статусы ответов по эндпоинтам, отдельно для потока."""
+
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.enabled = False
+
+    def call(self, client, endpoint, method, path, data=None):
+        started = time.perf_counter()
+        try:
+            status, content = client.request(method, path, data)
+        except (OSError, http.client.HTTPException) as error:
+            client.close()
+            status, content = type(error).__name__, b''
+        if self.enabled:
+            self.timings[endpoint].append(time.perf_counter() - started)
+            self.statuses[endpoint][str(status)] += 1
+        return status, content
+
+
+class Catalogue:
+    """Данные сервера, из которых сценарии выбирают параметры."""
+
+    def __init__(self, client, pages):
+        self.tags = [tag['slug'] for tag in client.json('GET', '/api/tags/')]
+        ingredients = client.json('GET', '/api/ingredients/')
+        if isinstance(ingredients, dict):
+            ingredients = ingredients['results']
+        self.prefixes = sorted({
+            ingredient['name'][:length].lower()
+            for ingredient in ingredients for length in (1, 2, 3)
+            if ingredient['name'][:length].strip()
+        })
+        self.recipes, self.authors = [], set()
+        self.list_pages = 1
+        for page in range(1, pages + 1):
+            data = client.json(
+                'GET', f'/api/recipes/?page={page}&limit=100',
+                expected=(200, 404)
+            )
+            if not data:
+                break
+            self.list_pages = max(1, min(3, data['count'] // LIST_LIMIT))
+            for recipe in data['results']:
+                self.recipes.append(recipe['id'])
+                self.authors.add(recipe['author']['id'])
+            if not data.get('next'):
+                break
+        self.authors = sorted(self.authors)
+        if not self.recipes:
+            raise RuntimeError('На сервере нет рецептов для теста')
+
+
+class User:
+    """Тестовый юзер: токен и состояние избранного и корзины."""
+
+    def __init__(self, base_url, run_id, index, timeout):
+        self.password = secrets.token_urlsafe(16)
+        self.email = f'loadtest-{run_id}-{index}@example.com'
+        anonymous = Client(base_url, timeout=timeout)
+        anonymous.json('POST', '/api/users/', {
+            'email': self.email,
+            'username': f'loadtest_{run_id}_{index}',
+            'first_name': 'Load',
+            'last_name': f'Test{index}',
+            'password': self.password,
+        })
+        token = anonymous.json('POST', '/api/auth/token/login/', {
+            'email': self.email, 'password': self.password,
+        })['auth_token']
+        anonymous.close()
+        self.client = Client(base_url, token=token, timeout=timeout)
+        self.lists = {'favorite': set(), 'shopping_cart': set()}
+        self.lock = threading.Lock()
+
+    def prepare(self, catalogue, rng, subscriptions, cart_size):
+        """Подписки и корзина, чтобы их списки не были пустыми."""
+        for author_id in rng.sample(
+            catalogue.authors, min(subscriptions, len(catalogue.authors))
+        ):
+            self.client.request('POST', f'/api/users/{author_id}/subscribe/')
+        for recipe_id in rng.sample(
+            catalogue.recipes, min(cart_size, len(catalogue.recipes))
+        ):
+            status, _ = self.client.request(
+                'POST', f'/api/recipes/{recipe_id}/shopping_cart/'
+            )
+            if status == 201:
+                self.lists['shopping_cart'].add(recipe_id)
+
+    def delete(self):
+        self.client.request(
+            'DELETE', '/api/users/me/', {'current_password': self.password}
+        )
+        self.client.close()
+
+
+def browse(worker):
+    catalogue, rng = worker.catalogue, worker.rng
+    params = [
+        ('page', rng.randint(1, catalogue.list_pages)), ('limit', LIST_LIMIT)
+    ]
+    if catalogue.tags:
+        for slug in rng.sample(catalogue.tags, min(2, len(catalogue.tags))):
+            params.append(('tags', slug))
+    worker.call(worker.anonymous, 'recipes_list', 'GET',
+                f'/api/recipes/?{urlencode(params)}')
+    if rng.random() < 0.3:
+        recipe_id = rng.choice(catalogue.recipes)
+        worker.call(worker.anonymous, 'recipe_detail', 'GET',
+                    f'/api/recipes/{recipe_id}/')
+
+
+def autocomplete(worker):
+    prefix = worker.rng.choice(worker.catalogue.prefixes or ['а'])
+    worker.call(worker.anonymous, 'ingredients_autocomplete', 'GET',
+                f'/api/ingredients/?{urlencode({"name": prefix})}')
+
+
+def toggle(worker):
+    user = worker.rng.choice(worker.users)
+    name = worker.rng.choice(('favorite', 'shopping_cart'))
+    recipe_id = worker.rng.choice(worker.catalogue.recipes)
+    with user.lock:
+        members = user.lists[name]
+        adding = recipe_id not in members
+        status, _ = worker.call(
+            user.client, f'{name}_{"add" if adding else "remove"}',
+            'POST' if adding else 'DELETE',
+            f'/api/recipes/{recipe_id}/{name}/'
+        )
+        if status in (200, 201):
+            if adding:
+                members.add(recipe_id)
+            else:
+                members.discard(recipe_id)
+
+
+def subscriptions(worker):
+    user = worker.rng.choice(worker.users)
+    with user.lock:
+        worker.call(user.client, 'subscriptions', 'GET',
+                    '/api/users/subscriptions/?limit=6&recipes_limit=3')
+
+
+def shopping_list(worker):
+    user = worker.rng.choice(worker.users)
+    with user.lock:
+        worker.call(user.client, 'download_shopping_cart', 'GET',
+                    '/api/recipes/download_shopping_cart/')
+
+
+SCENARIOS = {
+    'browse': browse,
+    'autocomplete': autocomplete,
+    'toggle': toggle,
+    'subscriptions': subscriptions,
+    'shopping_list': shopping_list,
+}
+
+
+class Worker(threading.Thread):
+    """Поток, выполняющий сценарии по весам до окончания теста."""
+
+    def __init__(self, index, options, catalogue, users, mix, stop):
+        super().__init__(daemon=True)
+        self.rng = random.Random(options.seed * 1000 + index)
+        self.anonymous = Client(options.base_url, timeout=options.timeout)
+        self.catalogue = catalogue
+        self.users = users
+        self.names = [name for name, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.stop = stop
+        self.recorder = Recorder()
+
+    def call(self, client, endpoint, method, path, data=None):
+        return self.recorder.call(client, endpoint, method, path, data)
+
+    def run(self):
+        while not self.stop.is_set():
+            name = self.rng.choices(self.names, self.weights)[0]
+            SCENARIOS[name](self)
+        self.anonymous.close()
+
+
+def parse_mix(value):
+    mix = []
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(
+                f'неизвестный сценарий {name}, есть: {", ".join(SCENARIOS)}'
+            )
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу отсортированного списка."""
+    if not values:
+        return None
+    index = max(0, int(round(fraction * len(values) + 0.5)) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def summarize(timings, statuses, duration):
+    timings = sorted(timings)
+    errors = sum(
+        count for status, count in statuses.items()
+        if not status.isdigit() or int(status) >= 400
+    )
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        'requests': len(timings),
+        'rps': round(len(timings) / duration, 2),
+        'errors': errors,
+        'throttled': statuses.get('429', 0),
+        'statuses': dict(sorted(statuses.items())),
+        'p50_ms': ms(percentile(timings, 0.50)),
+        'p95_ms': ms(percentile(timings, 0.95)),
+        'p99_ms': ms(percentile(timings, 0.99)),
+        'mean_ms': ms(sum(timings) / len(timings)) if timings else None,
+        'max_ms': ms(timings[-1]) if timings else None,
+    }
+
+
+def build_report(options, mix, workers, duration, started_at):
+    timings, statuses = defaultdict(list), defaultdict(
+        lambda: defaultdict(int)
+    )
+    for worker in workers:
+        for endpoint, values in worker.recorder.timings.items():
+            timings[endpoint].extend(values)
+        for endpoint, counts in worker.recorder.statuses.items():
+            for status, count in counts.items():
+                statuses[endpoint][status] += count
+    total_statuses = defaultdict(int)
+    for counts in statuses.values():
+        for status, count in counts.items():
+            total_statuses[status] += count
+    return {
+        'config': {
+            'base_url': options.base_url,
+            'duration': options.duration,
+            'warmup': options.warmup,
+            'concurrency': options.concurrency,
+            'users': options.users,
+            'mix': dict(mix),
+            'seed': options.seed,
+        },
+        'started_at': started_at,
+        'duration_s': round(duration, 2),
+        'total': summarize(
+            [value for values in timings.values() for value in values],
+            total_statuses, duration
+        ),
+        'endpoints': {
+            endpoint: summarize(timings[endpoint], statuses[endpoint],
+                                duration)
+            for endpoint in sorted(timings)
+        },
+    }
+
+
+def compare(report, path):
+    """Изменение RPS и p95 относительно прошлого отчета."""
+    with open(path, encoding='utf-8') as file:
+        previous = json.load(file)
+    lines = [f'{"эндпоинт":<28}{"rps":>18}{"p95, мс":>22}']
+    rows = dict(report['endpoints'], total=report['total'])
+    old_rows = dict(previous['endpoints'], total=previous['total'])
+    for endpoint, row in rows.items():
+        old = old_rows.get(endpoint)
+        if not old:
+            continue
+        lines.append(
+            f'{endpoint:<28}'
+            f'{old["rps"]:>8} -> {row["rps"]:<8}'
+            f'{old["p95_ms"] or 0:>10} -> {row["p95_ms"] or 0:<10}'
+        )
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--duration', type=float, default=30,
+                        help='длительность замера, с')
+    parser.add_argument('--warmup', type=float, default=5,
+                        help='прогрев без записи результатов, с')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='число одновременных клиентов')
+    parser.add_argument('--users', type=int, default=10,
+                        help='число тестовых юзеров')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help=f'веса сценариев, по умолчанию {DEFAULT_MIX}')
+    parser.add_argument('--pages', type=int, default=5,
+                        help='сколько страниц рецептов загрузить заранее')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='файл для JSON-отчета')
+    parser.add_argument('--compare', help='прошлый JSON-отчет')
+    parser.add_argument('--keep-users', action='store_true',
+                        help='не удалять тестовых юзеров после теста')
+    options = parser.parse_args()
+    mix = options.mix
+
+    rng = random.Random(options.seed)
+    setup = Client(options.base_url, timeout=options.timeout)
+    catalogue = Catalogue(setup, options.pages)
+    setup.close()
+    run_id = secrets.token_hex(3)
+    users = [
+        User(options.base_url, run_id, index, options.timeout)
+        for index in range(options.users)
+    ]
+    try:
+        for user in users:
+            user.prepare(catalogue, rng, subscriptions=3, cart_size=5)
+        stop = threading.Event()
+        workers = [
+            Worker(index, options, catalogue, users, mix, stop)
+            for index in range(options.concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+        time.sleep(options.warmup)
+        started_at = datetime.now(timezone.utc).isoformat()
+        started = time.perf_counter()
+        for worker in workers:
+            worker.recorder.enabled = True
+        time.sleep(options.duration)
+        for worker in workers:
+            worker.recorder.enabled = False
+        duration = time.perf_counter() - started
+        stop.set()
+        for worker in workers:
+            worker.join()
+    finally:
+        if not options.keep_users:
+            for user in users:
+                user.delete()
+
+    report = build_report(options, mix, workers, duration, started_at)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+    if options.compare:
+        print(compare(report, options.compare), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()